@@ -0,0 +1,266 @@
+"""
+Opt-in admission control with priority-aware load shedding
+
+Enable with TECHLINGO_ADMISSION=1. Every request is sorted into a tier,
+highest priority first:
+
+    critical   the game loop (/game/...)
+    standard   everything not listed elsewhere
+    expensive  the /progress aggregate
+    auth       Argon2: POST /auth/login and /auth/register
+
+Hashing runs outside the event loop but competes with it for CPU, so by
+default only one auth request per two CPUs runs at a time.
+
+Each tier runs at most ADMISSION_CONCURRENCY requests at once and queues
+the rest in arrival order. A request that would wait longer than the
+tier's ADMISSION_BUDGET_MS (estimated from its recent service times), or
+that does wait that long, is answered 503; so is a request while a higher
+tier has a queue, so logins back off before the game loop does. Every
+client (user id from the bearer token, else address) also has a token
+bucket per tier, refilled at ADMISSION_RATE requests per second up to
+ADMISSION_BURST; an empty bucket is answered 429. Both carry Retry-After.
+
+Limits apply per worker process. Counters go to the metrics registry and
+are served at /metrics with TECHLINGO_METRICS=1.
+"""
+
+import asyncio
+import json
+import math
+import os
+import time
+from collections import OrderedDict, deque
+from typing import Deque, Dict, Optional, Tuple
+
+from auth import principal_from_payload, verify_token_cached
+from metrics import registry
+
+TIERS = ("critical", "standard", "expensive", "auth")  # highest priority first
+
+
+def _per_tier(name: str, defaults: Dict[str, float]) -> Dict[str, float]:
+    """Read `tier=value,...` from the environment over the defaults"""
+    values = dict(defaults)
+    for item in filter(None, os.getenv(name, "").split(",")):
+        tier, _, value = item.partition("=")
+        if tier.strip() not in values:
+            raise ValueError(f"{name}: unknown tier {tier.strip()!r}")
+        values[tier.strip()] = float(value)
+    return values
+
+
+ADMISSION_ENABLED = os.getenv("TECHLINGO_ADMISSION", "0") == "1"
+ADMISSION_CONCURRENCY = _per_tier("ADMISSION_CONCURRENCY", {
+    "critical": 64, "standard": 32, "expensive": 8, "auth": max(1, (os.cpu_count() or 1) // 2),
+})
+ADMISSION_BUDGET_MS = _per_tier("ADMISSION_BUDGET_MS", {
+    "critical": 250, "standard": 500, "expensive": 1000, "auth": 1000,
+})
+ADMISSION_RATE = _per_tier("ADMISSION_RATE", {
+    "critical": 20, "standard": 10, "expensive": 5, "auth": 2,
+})
+ADMISSION_BURST = _per_tier("ADMISSION_BURST", {
+    "critical": 40, "standard": 20, "expensive": 10, "auth": 10,
+})
+# Idle buckets are full anyway, so the least recently used ones can go
+ADMISSION_MAX_BUCKETS = 100_000
+
+# Streams hold a slot for their whole life; probes must never be shed
+EXEMPT_PATHS = {"/health", "/metrics", "/events"}
+
+registry.describe("techlingo_admission_total", "counter", "Admission decisions by tier and outcome")
+registry.describe("techlingo_admission_wait_seconds", "histogram", "Time queued before admission")
+registry.describe("techlingo_admission_in_flight", "gauge", "Admitted requests running, by tier")
+registry.describe("techlingo_admission_queued", "gauge", "Requests waiting for a slot, by tier")
+
+
+def classify(method: str, path: str) -> Optional[str]:
+    """Tier of a request, or None when it bypasses admission"""
+    if method == "OPTIONS" or path in EXEMPT_PATHS:
+        return None
+    if path.startswith("/game/"):
+        return "critical"
+    if method == "POST" and path in ("/auth/login", "/auth/register"):
+        return "auth"
+    if path == "/progress":
+        return "expensive"
+    return "standard"
+
+
+def client_key(scope) -> str:
+    """User id from a valid bearer token, else the client address"""
+    for name, value in scope["headers"]:
+        if name == b"authorization":
+            scheme, _, token = value.decode("latin-1").partition(" ")
+            if scheme.lower() == "bearer" and token:
+                payload = verify_token_cached(token)
+                principal = principal_from_payload(payload) if payload else None
+                if principal is not None:
+                    return f"user:{principal.id}"
+            break
+    client = scope.get("client")
+    return f"addr:{client[0]}" if client else "addr:unknown"
+
+
+# =========================
+# TOKEN BUCKETS
+# =========================
+
+class RateLimiter:
+    """Token bucket per (tier, client), kept for the most recent clients only"""
+
+    def __init__(self, max_buckets: int = ADMISSION_MAX_BUCKETS):
+        self.max_buckets = max_buckets
+        self._buckets: "OrderedDict[Tuple[str, str], Tuple[float, float]]" = OrderedDict()
+
+    def take(self, tier: str, key: str, now: float) -> float:
+        """Spend a token: 0 when one was available, else seconds until there is one"""
+        rate, burst = ADMISSION_RATE[tier], ADMISSION_BURST[tier]
+        tokens, updated = self._buckets.pop((tier, key), (burst, now))
+        tokens = min(burst, tokens + (now - updated) * rate)
+
+        wait = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            wait = (1 - tokens) / rate
+
+        self._buckets[(tier, key)] = (tokens, now)
+        if len(self._buckets) > self.max_buckets:
+            self._buckets.popitem(last=False)
+        return wait
+
+
+# =========================
+# CONCURRENCY LIMITS
+# =========================
+
+class TierGate:
+    """Concurrency limit of one tier, with a FIFO queue bounded by a latency budget"""
+
+    def __init__(self, tier: str):
+        self.tier = tier
+        self.limit = int(ADMISSION_CONCURRENCY[tier])
+        self.budget = ADMISSION_BUDGET_MS[tier] / 1000
+        self.active = 0
+        self.service_time = 0.0  # moving average of admitted requests, seconds
+        self._waiters: Deque[asyncio.Future] = deque()
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    def estimated_wait(self) -> float:
+        """How long a request arriving now would queue"""
+        if self.active < self.limit and not self._waiters:
+            return 0.0
+        return (len(self._waiters) + 1) * self.service_time / self.limit
+
+    async def acquire(self) -> bool:
+        """Take a slot, waiting at most the budget; False when none came up in time"""
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+            return True
+
+        loop = asyncio.get_running_loop()
+        waiter = loop.create_future()
+        self._waiters.append(waiter)
+        # A timer rather than wait_for, which would start a task per queued request
+        timer = loop.call_later(self.budget, self._expire, waiter)
+        try:
+            return await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled() and waiter.result():
+                self.release(0.0)  # handed a slot, but the client went away
+            elif waiter in self._waiters:
+                self._waiters.remove(waiter)
+            raise
+        finally:
+            timer.cancel()
+
+    def _expire(self, waiter: asyncio.Future):
+        if not waiter.done():
+            self._waiters.remove(waiter)
+            waiter.set_result(False)
+
+    def release(self, elapsed: float):
+        if elapsed:
+            self.service_time += (elapsed - self.service_time) * 0.1
+        # Hand the slot straight to the next waiter, so arrivals cannot jump the queue
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(True)
+                return
+        self.active -= 1
+
+
+# =========================
+# MIDDLEWARE
+# =========================
+
+class AdmissionMiddleware:
+    """Pure ASGI middleware admitting, queueing or rejecting requests by tier"""
+
+    def __init__(self, app):
+        self.app = app
+        self.gates = {tier: TierGate(tier) for tier in TIERS}
+        self.rate_limiter = RateLimiter()
+        for tier, gate in self.gates.items():
+            registry.gauge("techlingo_admission_in_flight", lambda g=gate: g.active, tier=tier)
+            registry.gauge("techlingo_admission_queued", lambda g=gate: g.queued, tier=tier)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        tier = classify(scope["method"], scope["path"])
+        if tier is None:
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        wait = self.rate_limiter.take(tier, client_key(scope), start)
+        if wait:
+            registry.inc("techlingo_admission_total", tier=tier, outcome="rate_limited")
+            await _reject(send, 429, "Too many requests", wait)
+            return
+
+        gate = self.gates[tier]
+        if self._higher_tier_queued(tier) or gate.estimated_wait() > gate.budget:
+            outcome = "shed"
+        elif not await gate.acquire():
+            outcome = "timed_out"
+        else:
+            outcome = None
+        if outcome is not None:
+            registry.inc("techlingo_admission_total", tier=tier, outcome=outcome)
+            await _reject(send, 503, "Server busy, retry shortly", max(gate.estimated_wait(), 1.0))
+            return
+
+        admitted = time.perf_counter()
+        registry.histogram("techlingo_admission_wait_seconds", tier=tier).observe(admitted - start)
+        registry.inc("techlingo_admission_total", tier=tier, outcome="admitted")
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            gate.release(time.perf_counter() - admitted)
+
+    def _higher_tier_queued(self, tier: str) -> bool:
+        return any(self.gates[t].queued for t in TIERS[:TIERS.index(tier)])
+
+
+async def _reject(send, status: int, detail: str, retry_after: float):
+    body = json.dumps({"detail": detail}).encode()
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            (b"retry-after", str(math.ceil(retry_after)).encode()),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
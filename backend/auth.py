@@ -2,11 +2,19 @@
 Authentication utilities using JWT and password hashing
 """
 
+import asyncio
+import hmac
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from datetime import datetime, timedelta, timezone
-from typing import Optional
+from typing import Dict, Optional, Tuple
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 
+from metrics import timed
+
 # =========================
 # CONFIGURATION
 # =========================
@@ -14,22 +22,53 @@ from passlib.context import CryptContext
 SECRET_KEY = "your-secret-key-change-in-production"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24 * 7  # 7 days
+# Tokens for GET /events travel in the URL, where access logs keep them
+EVENTS_TOKEN_EXPIRE_SECONDS = 60
+EVENTS_TOKEN_SCOPE = "events"
+TOKEN_CACHE_TTL_SECONDS = 300
+TOKEN_CACHE_MAX_SIZE = 10_000
+
+# Shared secret for /admin routes (sent as X-Admin-Token); unset disables them
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
 
 # =========================
 # PASSWORD HASHING (ARGON2)
 # =========================
 # bcrypt REMOVED completely (Windows-safe, no 72-byte limit)
 
+# Cost parameters; hashes made with other values are upgraded on next login
+ARGON2_TIME_COST = int(os.getenv("ARGON2_TIME_COST", "3"))
+ARGON2_MEMORY_COST = int(os.getenv("ARGON2_MEMORY_COST", "65536"))  # KiB
+ARGON2_PARALLELISM = int(os.getenv("ARGON2_PARALLELISM", "4"))
+
+# Hashing runs on its own bounded pool so it never blocks the event loop
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))
+PASSWORD_HASH_QUEUE_LIMIT = int(os.getenv("PASSWORD_HASH_QUEUE_LIMIT", "32"))
+
 pwd_context = CryptContext(
     schemes=["argon2"],   #doesnot contain password length
     deprecated="auto",
+    argon2__rounds=ARGON2_TIME_COST,
+    argon2__memory_cost=ARGON2_MEMORY_COST,
+    argon2__parallelism=ARGON2_PARALLELISM,
 )
 
+_hash_executor = ThreadPoolExecutor(
+    max_workers=PASSWORD_HASH_WORKERS,
+    thread_name_prefix="argon2",
+)
+_hash_jobs = 0
+
+
+class PasswordHasherBusy(Exception):
+    """Raised when the hashing pool already has a full queue"""
+
 def get_password_hash(password: str) -> str:
     """
     Hash a password using Argon2
     """
-    return pwd_context.hash(password)
+    with timed("argon2_hash"):
+        return pwd_context.hash(password)
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
@@ -37,11 +76,63 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     Verify password using Argon2
     """
     try:
-        return pwd_context.verify(plain_password, hashed_password)
+        with timed("argon2_verify"):
+            return pwd_context.verify(plain_password, hashed_password)
     except Exception:
         return False
 
 
+def verify_and_update_password(
+    plain_password: str,
+    hashed_password: str
+) -> Tuple[bool, Optional[str]]:
+    """
+    Verify password and return a new hash if the stored one uses outdated parameters
+    """
+    try:
+        with timed("argon2_verify"):
+            return pwd_context.verify_and_update(plain_password, hashed_password)
+    except Exception:
+        return False, None
+
+
+async def _run_on_hash_pool(func, *args):
+    """
+    Run a hashing call on the bounded pool.
+    Fails fast with PasswordHasherBusy instead of queueing without limit.
+    """
+    global _hash_jobs
+
+    if _hash_jobs >= PASSWORD_HASH_QUEUE_LIMIT:
+        raise PasswordHasherBusy()
+
+    _hash_jobs += 1
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_hash_executor, func, *args)
+    finally:
+        _hash_jobs -= 1
+
+
+async def get_password_hash_async(password: str) -> str:
+    """
+    Hash a password off the event loop
+    """
+    return await _run_on_hash_pool(get_password_hash, password)
+
+
+async def verify_and_update_password_async(
+    plain_password: str,
+    hashed_password: str
+) -> Tuple[bool, Optional[str]]:
+    """
+    Verify a password off the event loop, returning (valid, new_hash_or_None)
+    """
+    return await _run_on_hash_pool(
+        verify_and_update_password, plain_password, hashed_password
+    )
+
+
 # =========================
 # JWT UTILITIES
 # =========================
@@ -64,11 +155,12 @@ def create_access_token( #creates a signal for jwt token
 
     to_encode.update({"exp": expire})
 
-    encoded_jwt = jwt.encode(#provides the token
-        to_encode,
-        SECRET_KEY,
-        algorithm=ALGORITHM
-    )
+    with timed("jwt_encode"):
+        encoded_jwt = jwt.encode(#provides the token
+            to_encode,
+            SECRET_KEY,
+            algorithm=ALGORITHM
+        )
 
     return encoded_jwt
 
@@ -78,11 +170,92 @@ def verify_token(token: str) -> Optional[dict]:
     Verify and decode a JWT token
     """
     try:
-        payload = jwt.decode(
-            token,
-            SECRET_KEY,
-            algorithms=[ALGORITHM]
-        )
+        with timed("jwt_decode"):
+            payload = jwt.decode(
+                token,
+                SECRET_KEY,
+                algorithms=[ALGORITHM]
+            )
         return payload
     except JWTError:
         return None
+
+
+# =========================
+# TOKEN CACHE
+# =========================
+# Keyed by the signature segment; the full token is stored alongside the
+# payload so a forged header/payload reusing a known signature never hits
+
+_token_cache: Dict[str, Tuple[str, dict, float]] = {}
+
+
+def verify_token_cached(token: str) -> Optional[dict]:
+    """
+    Verify a JWT token, reusing the decoded payload of recently seen tokens
+    """
+    signature = token.rsplit(".", 1)[-1]
+    now = time.monotonic()
+
+    cached = _token_cache.get(signature)
+    if cached is not None:
+        cached_token, payload, expires_at = cached
+        if cached_token == token and now < expires_at:
+            return payload
+        del _token_cache[signature]
+
+    payload = verify_token(token)
+    if payload is None:
+        return None
+
+    # Never cache past the token's own expiry
+    remaining = payload.get("exp", 0) - time.time()
+    ttl = min(TOKEN_CACHE_TTL_SECONDS, remaining)
+    if ttl > 0:
+        if len(_token_cache) >= TOKEN_CACHE_MAX_SIZE:
+            # dicts keep insertion order, so this drops the oldest entry
+            del _token_cache[next(iter(_token_cache))]
+        _token_cache[signature] = (token, payload, now + ttl)
+
+    return payload
+
+
+# =========================
+# PRINCIPAL
+# =========================
+
+@dataclass(frozen=True)
+class Principal:
+    """Authenticated caller built from JWT claims, without a database lookup"""
+    id: int
+    username: Optional[str] = None
+
+
+def principal_from_payload(payload: dict, scope: Optional[str] = None) -> Optional[Principal]:
+    """
+    Build a Principal from a decoded token payload. Scoped tokens only
+    authenticate for their scope, access tokens (no scope) for the rest.
+    """
+    user_id = payload.get("sub")
+    if user_id is None or payload.get("scope") != scope:
+        return None
+
+    try:
+        return Principal(id=int(user_id), username=payload.get("username"))
+    except (TypeError, ValueError):
+        return None
+
+
+def create_events_token(principal: Principal) -> str:
+    """Short-lived token that only opens the /events stream"""
+    return create_access_token(
+        {"sub": str(principal.id), "username": principal.username, "scope": EVENTS_TOKEN_SCOPE},
+        timedelta(seconds=EVENTS_TOKEN_EXPIRE_SECONDS),
+    )
+
+
+def is_admin_token(token: Optional[str]) -> bool:
+    """Constant-time check of an X-Admin-Token header"""
+    if not ADMIN_TOKEN or not token:
+        return False
+    return hmac.compare_digest(token.encode(), ADMIN_TOKEN.encode())
@@ -0,0 +1,66 @@
+"""
+Shared helpers for the benchmark scripts
+"""
+
+import logging
+import math
+import os
+import sys
+import tempfile
+from typing import List
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def use_backend(backend_dir: str = BACKEND_DIR) -> str:
+    """
+    Make `backend_dir` importable and move into a fresh temporary directory,
+    so the relative SQLite URL points at a throwaway database.
+    Must run before the app modules are imported.
+    """
+    sys.path.insert(0, os.path.abspath(backend_dir))
+    workdir = tempfile.mkdtemp(prefix="techlingo-bench-")
+    os.chdir(workdir)
+    logging.disable(logging.INFO)
+    return workdir
+
+
+def migrate_database():
+    """
+    Bring the throwaway database to the benchmarked checkout's schema.
+    Checkouts without migrations.py create their tables from their own
+    models rather than picking up this checkout's migrations.
+    """
+    import database
+
+    backend_dir = os.path.dirname(os.path.abspath(database.__file__))
+    if os.path.exists(os.path.join(backend_dir, "migrations.py")):
+        from migrations import upgrade
+        upgrade()
+    else:  # checkouts from before versioned migrations
+        import models  # noqa: F401  registers the tables on Base.metadata
+        database.Base.metadata.create_all(bind=database.engine)
+
+
+def prepare_database():
+    """Migrate and seed the throwaway database, as a deploy would"""
+    from database import SessionLocal
+
+    migrate_database()
+    try:
+        from seed_data import seed_database
+    except ImportError:  # checkouts from before seeding moved out of startup
+        return
+    db = SessionLocal()
+    try:
+        seed_database(db)
+    finally:
+        db.close()
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(math.ceil(pct / 100 * len(sorted_values)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
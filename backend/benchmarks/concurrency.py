@@ -0,0 +1,90 @@
+"""
+Requests/sec benchmark for the API under concurrent clients
+
+Runs the app in-process against a throwaway SQLite database:
+
+    cd backend
+    python -m benchmarks.concurrency --requests 2000 --concurrency 50
+
+Use --backend to point at another checkout of backend/ to compare commits.
+"""
+
+import argparse
+import asyncio
+import time
+
+from benchmarks.common import BACKEND_DIR, prepare_database, use_backend
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument(
+        "--backend",
+        default=BACKEND_DIR,
+        help="Path of the backend/ directory to benchmark",
+    )
+    return parser.parse_args()
+
+
+async def run(app, total: int, concurrency: int):
+    import httpx
+
+    # Unhandled errors (e.g. "database is locked") count as 500s instead of aborting the run
+    transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+
+    async with app.router.lifespan_context(app), httpx.AsyncClient(
+        transport=transport, base_url="http://bench"
+    ) as client:
+        await client.post("/auth/register", json={
+            "email": "bench@example.com", "username": "bench", "password": "benchpass",
+        })
+        r = await client.post("/auth/login", data={"username": "bench", "password": "benchpass"})
+        headers = {"Authorization": f"Bearer {r.json()['access_token']}"}
+
+        routes = [
+            ("GET", "/terms", None),
+            ("GET", "/progress/leaderboard", None),
+            ("GET", "/progress", headers),
+            ("POST", "/game/start", headers),
+        ]
+
+        results = {}
+        for method, path, route_headers in routes:
+            queue = asyncio.Queue()
+            for _ in range(total):
+                queue.put_nowait(None)
+
+            async def worker():
+                while not queue.empty():
+                    queue.get_nowait()
+                    body = {} if method == "POST" else None
+                    response = await client.request(method, path, headers=route_headers, json=body)
+                    response.raise_for_status()
+
+            start = time.perf_counter()
+            await asyncio.gather(*(worker() for _ in range(concurrency)))
+            elapsed = time.perf_counter() - start
+            results[f"{method} {path}"] = total / elapsed
+
+        return results
+
+
+def main():
+    args = parse_args()
+
+    use_backend(args.backend)
+    prepare_database()
+
+    from main import app
+
+    results = asyncio.run(run(app, args.requests, args.concurrency))
+
+    print(f"{args.requests} requests per route, concurrency {args.concurrency}")
+    for route, rps in results.items():
+        print(f"  {route:<32} {rps:9.1f} req/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,323 @@
+"""
+Load test for the game loop
+
+Starts the app in-process (no network) against a temporary SQLite
+database, or an empty database given by DATABASE_URL (e.g. PostgreSQL),
+seeded with --users background users and --terms terms, then runs
+--clients simulated players at --concurrency. Each player does:
+
+    register, login, /game/start, 5x (question, answer),
+    /game/{id}/end, /progress, /progress/leaderboard
+
+or, with --round, GET and POST /game/{id}/round in place of the
+question/answer pairs and /end. --rtt-ms adds a simulated network round
+trip to every request, as seen by a mobile client. --login-storm keeps
+that many extra clients logging in for the whole run, to see how the
+game loop holds up next to Argon2. Every client has its own address, as
+separate devices would, and retries a 429/503 after its Retry-After;
+each attempt counts in the latencies and errors.
+
+Reports p50/p95/p99 latency and throughput per route, and the time from
+/game/start to the end of the game ("game"):
+
+    cd backend
+    python -m benchmarks.loadtest --clients 200 --concurrency 20 --output result.json
+    python -m benchmarks.loadtest --round --rtt-ms 150
+    TECHLINGO_ADMISSION=1 python -m benchmarks.loadtest --login-storm 50
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import time
+from collections import defaultdict
+from typing import Dict, List
+
+from benchmarks.common import BACKEND_DIR, migrate_database, percentile, prepare_database, use_backend
+
+CATEGORIES = ["Web Development", "Security", "DevOps", "Database", "Architecture"]
+DIFFICULTIES = ["beginner", "intermediate", "advanced"]
+RETRIES = 5  # per request, after a 429/503 with Retry-After
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--users", type=int, default=1000, help="Background users to seed")
+    parser.add_argument("--terms", type=int, default=1000, help="Synthetic terms to seed")
+    parser.add_argument("--clients", type=int, default=100, help="Simulated players")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--accuracy", type=float, default=0.7, help="Share of correct answers")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--round", action="store_true", help="Play through the batched round API")
+    parser.add_argument("--rtt-ms", type=float, default=0, help="Simulated network round trip per request")
+    parser.add_argument("--login-storm", type=int, default=0, help="Clients logging in continuously")
+    parser.add_argument("--output", help="Write the JSON result to this file")
+    parser.add_argument("--backend", default=BACKEND_DIR)
+    return parser.parse_args()
+
+
+def seed_database(users: int, terms: int):
+    """Bulk-insert background users and synthetic terms before startup"""
+    from sqlalchemy import insert
+
+    from auth import get_password_hash
+    from database import SessionLocal
+    from models import Term, User
+    from seed_data import seed_terms
+
+    migrate_database()
+    db = SessionLocal()
+    try:
+        seed_terms(db)
+
+        db.execute(insert(Term), [
+            {
+                "name": f"Synthetic Term {i}",
+                "definition": f"Synthetic definition number {i} used for load testing.",
+                "category": CATEGORIES[i % len(CATEGORIES)],
+                "difficulty": DIFFICULTIES[i % len(DIFFICULTIES)],
+                "code_example": None,
+                "real_world_example": f"Synthetic example {i}.",
+            }
+            for i in range(terms)
+        ])
+
+        # One hash shared by every background user keeps seeding fast
+        hashed = get_password_hash("loadtest")
+        db.execute(insert(User), [
+            {
+                "email": f"seed{i}@example.com",
+                "username": f"seed{i}",
+                "hashed_password": hashed,
+                "total_xp": (i * 37) % 5000,
+                "current_streak": i % 7,
+            }
+            for i in range(users)
+        ])
+        db.commit()
+    finally:
+        db.close()
+
+    prepare_database()  # builds the distractor index over all the terms
+
+
+class Recorder:
+    def __init__(self, rtt: float = 0):
+        self.rtt = rtt
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+
+    async def call(self, client, route: str, method: str, url: str, **kwargs):
+        """Send a request, retrying a few times when a 429/503 says when to"""
+        for attempt in range(RETRIES + 1):
+            start = time.perf_counter()
+            if self.rtt:
+                await asyncio.sleep(self.rtt)
+            response = await client.request(method, url, **kwargs)
+            self.latencies[route].append(time.perf_counter() - start)
+            if response.status_code < 400:
+                return response
+            self.errors[route] += 1
+            retry_after = response.headers.get("retry-after")
+            if response.status_code not in (429, 503) or retry_after is None:
+                return response
+            await asyncio.sleep(float(retry_after))
+        return response
+
+
+async def play(
+    client, recorder: Recorder, player: int, rng: random.Random, accuracy: float, rounds: bool
+):
+    call = recorder.call
+
+    credentials = {"username": f"player{player}", "password": "loadtest"}
+    await call(client, "POST /auth/register", "POST", "/auth/register", json={
+        "email": f"player{player}@example.com", **credentials,
+    })
+    r = await call(client, "POST /auth/login", "POST", "/auth/login", data=credentials)
+    if r.status_code != 200:
+        return
+    headers = {"Authorization": f"Bearer {r.json()['access_token']}"}
+
+    game_start = time.perf_counter()
+    r = await call(client, "POST /game/start", "POST", "/game/start", json={}, headers=headers)
+    if r.status_code != 200:
+        return
+    session_id = r.json()["id"]
+
+    if rounds:
+        await play_round(client, recorder, session_id, headers, rng, accuracy)
+    else:
+        await play_questions(client, recorder, session_id, headers, rng, accuracy)
+    recorder.latencies["game"].append(time.perf_counter() - game_start)
+
+    await call(client, "GET /progress", "GET", "/progress", headers=headers)
+    await call(client, "GET /progress/leaderboard", "GET", "/progress/leaderboard")
+
+
+async def play_questions(client, recorder: Recorder, session_id: int, headers, rng, accuracy: float):
+    call = recorder.call
+    for _ in range(5):
+        r = await call(
+            client, "GET /game/{id}/question", "GET",
+            f"/game/{session_id}/question", headers=headers,
+        )
+        if r.status_code != 200:
+            break
+        question = r.json()
+        answer = question["correct_answer"] if rng.random() < accuracy else ""
+        await call(
+            client, "POST /game/{id}/answer", "POST", f"/game/{session_id}/answer",
+            json={"term_id": question["term_id"], "answer": answer}, headers=headers,
+        )
+
+    await call(client, "POST /game/{id}/end", "POST", f"/game/{session_id}/end", headers=headers)
+
+
+async def play_round(client, recorder: Recorder, session_id: int, headers, rng, accuracy: float):
+    call = recorder.call
+    r = await call(client, "GET /game/{id}/round", "GET", f"/game/{session_id}/round", headers=headers)
+    if r.status_code != 200:
+        return
+    answers = [
+        {
+            "term_id": question["term_id"],
+            "answer": question["correct_answer"] if rng.random() < accuracy else "",
+        }
+        for question in r.json()["questions"]
+    ]
+    await call(
+        client, "POST /game/{id}/round", "POST", f"/game/{session_id}/round",
+        json={"answers": answers}, headers=headers,
+    )
+
+
+def client_for(app, number: int):
+    """HTTP client calling the app in-process from its own address"""
+    import httpx
+
+    address = f"10.{number >> 16 & 255}.{number >> 8 & 255}.{number & 255}"
+    # Unhandled errors (e.g. "database is locked") count as 500s instead of aborting the run
+    transport = httpx.ASGITransport(app=app, raise_app_exceptions=False, client=(address, 50000))
+    return httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=None)
+
+
+async def storm(client, recorder: Recorder, number: int, done: asyncio.Event):
+    """Log in over and over until the players are done"""
+    credentials = {"username": f"storm{number}", "password": "loadtest"}
+    while not done.is_set():
+        r = await recorder.call(client, "storm POST /auth/register", "POST", "/auth/register", json={
+            "email": f"storm{number}@example.com", **credentials,
+        })
+        if r.status_code not in (429, 503):
+            break
+    while not done.is_set():
+        await recorder.call(client, "storm POST /auth/login", "POST", "/auth/login", data=credentials)
+
+
+async def run(app, args) -> dict:
+    recorder = Recorder(args.rtt_ms / 1000)
+    rng = random.Random(args.seed)
+    players = asyncio.Queue()
+    for player in range(args.clients):
+        players.put_nowait(player)
+
+    async with app.router.lifespan_context(app):
+
+        async def worker():
+            while not players.empty():
+                player = players.get_nowait()
+                async with client_for(app, player) as client:
+                    await play(client, recorder, player, rng, args.accuracy, args.round)
+
+        async def storm_worker(number: int):
+            async with client_for(app, args.clients + number) as client:
+                await storm(client, recorder, number, done)
+
+        done = asyncio.Event()
+        storms = [asyncio.create_task(storm_worker(n)) for n in range(args.login_storm)]
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - start
+
+        done.set()
+        await asyncio.gather(*storms)
+
+    routes = {}
+    for route, samples in sorted(recorder.latencies.items()):
+        samples.sort()
+        routes[route] = {
+            "count": len(samples),
+            "errors": recorder.errors.get(route, 0),
+            "throughput_rps": round(len(samples) / elapsed, 1),
+            "p50_ms": round(percentile(samples, 50) * 1000, 2),
+            "p95_ms": round(percentile(samples, 95) * 1000, 2),
+            "p99_ms": round(percentile(samples, 99) * 1000, 2),
+        }
+
+    total = sum(r["count"] for route, r in routes.items() if route != "game")
+    return {
+        "elapsed_s": round(elapsed, 3),
+        "requests": total,
+        "throughput_rps": round(total / elapsed, 1),
+        "errors": sum(r["errors"] for r in routes.values()),
+        "routes": routes,
+    }
+
+
+def git_revision(path: str) -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=path, text=True,
+            stderr=subprocess.DEVNULL,
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def main():
+    args = parse_args()
+    revision = git_revision(args.backend)
+    output = os.path.abspath(args.output) if args.output else None
+
+    use_backend(args.backend)
+
+    from database import engine
+    from main import app
+    seed_database(args.users, args.terms)
+
+    result = asyncio.run(run(app, args))
+    result = {
+        "revision": revision,
+        "python": platform.python_version(),
+        "database": engine.dialect.name,
+        "config": {
+            "users": args.users, "terms": args.terms, "clients": args.clients,
+            "concurrency": args.concurrency, "accuracy": args.accuracy, "seed": args.seed,
+            "round": args.round, "rtt_ms": args.rtt_ms, "login_storm": args.login_storm,
+        },
+        **result,
+    }
+
+    print(f"{'route':<28} {'count':>6} {'err':>4} {'rps':>8} {'p50':>8} {'p95':>8} {'p99':>8}")
+    for route, stats in result["routes"].items():
+        print(
+            f"{route:<28} {stats['count']:>6} {stats['errors']:>4} "
+            f"{stats['throughput_rps']:>8} {stats['p50_ms']:>8} "
+            f"{stats['p95_ms']:>8} {stats['p99_ms']:>8}"
+        )
+    print(f"total {result['requests']} requests in {result['elapsed_s']}s "
+          f"({result['throughput_rps']} req/s, {result['errors']} errors)")
+
+    if output:
+        with open(output, "w") as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
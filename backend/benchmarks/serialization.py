@@ -0,0 +1,159 @@
+"""
+Serialization cost per endpoint: response_model vs the orjson fast path
+
+For catalogs of --sizes terms, builds each route's payload in memory
+and times the three ways it can reach the wire:
+
+    models   handler builds Pydantic models, FastAPI validates and encodes
+             them through response_model (how these routes used to work)
+    dicts    handler returns plain dicts, FastAPI validates and encodes
+             (the default path)
+    orjson   TECHLINGO_FAST_JSON=1: plain dicts straight to orjson
+
+/terms is measured as the build of its cached body. /terms/page
+serializes up to its 200-row limit and /progress/leaderboard one entry
+per term; the question routes do not grow with the catalog.
+
+    cd backend
+    python -m benchmarks.serialization --sizes 10,1000,10000
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+from dataclasses import asdict
+from datetime import datetime, timedelta, timezone
+
+from benchmarks.common import BACKEND_DIR, use_backend
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", default="10,1000,10000", help="Catalog sizes")
+    parser.add_argument("--seconds", type=float, default=0.5, help="Time per measurement")
+    parser.add_argument("--backend", default=BACKEND_DIR)
+    return parser.parse_args()
+
+
+def synthetic_terms(count: int):
+    from catalog import CatalogTerm
+
+    rng = random.Random(count)
+    # PostgreSQL returns tz-aware timestamps, SQLite naive ones: mix both
+    created = datetime(2024, 1, 1, 12, 0, 0, 123456)
+    return [
+        CatalogTerm(
+            id=i + 1,
+            name=f"Term {i}",
+            definition=f"Synthetic definition number {i} for the serialization benchmark.",
+            category=rng.choice(["Web Development", "Security", "DevOps", "Database"]),
+            difficulty=rng.choice(["beginner", "intermediate", "advanced"]),
+            code_example=f"example_{i}()" if i % 2 else None,
+            real_world_example=f"Synthetic example {i}.",
+            created_at=(created + timedelta(seconds=i)).replace(tzinfo=timezone.utc if i % 2 else None),
+        )
+        for i in range(count)
+    ]
+
+
+async def call(fn):
+    result = fn()
+    if asyncio.iscoroutine(result):
+        result = await result
+    return result
+
+
+async def per_call(fn, seconds: float) -> float:
+    """Mean seconds per call of the (possibly async) `fn`"""
+    calls, start = 0, time.perf_counter()
+    while True:
+        await call(fn)
+        calls += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= seconds:
+            return elapsed / calls
+
+
+async def run(args):
+    from fastapi.responses import JSONResponse
+    from fastapi.routing import serialize_response
+    from pydantic import TypeAdapter
+
+    import main
+    from fast_json import FastJSONResponse, dump_terms
+    from schemas import GameQuestionResponse, LeaderboardEntry, TermListResponse, TermResponse
+
+    fields = {
+        route.path: route.response_field
+        for route in main.app.routes if hasattr(route, "response_field")
+    }
+    term_list = TypeAdapter(list[TermResponse])
+
+    async def through_response_model(path, content):
+        return JSONResponse(await serialize_response(field=fields[path], response_content=content)).body
+
+    print(f"{'endpoint':<28} {'terms':>6} {'items':>6} "
+          f"{'models':>10} {'dicts':>10} {'orjson':>10} {'speedup':>8}")
+    for size in [int(s) for s in args.sizes.split(",")]:
+        terms = synthetic_terms(size)
+        options = [t.name for t in terms[:4]]
+        question = main._question_response(1, terms[0], options)
+        page = {"terms": [asdict(t) for t in terms[:200]], "total": size, "next_cursor": None}
+        entries = [
+            {"rank": i + 1, "username": f"user{i}", "total_xp": 10 * (size - i), "current_streak": i % 7}
+            for i in range(size)
+        ]
+
+        cases = [
+            ("GET /terms", size,
+             lambda: term_list.dump_json([TermResponse.model_validate(t) for t in terms]),
+             None,
+             lambda: dump_terms(terms)),
+            ("GET /terms/page", len(page["terms"]),
+             lambda: through_response_model("/terms/page", TermListResponse(**page)),
+             lambda: through_response_model("/terms/page", page),
+             lambda: FastJSONResponse(page).body),
+            ("GET /game/{id}/question", 1,
+             lambda: through_response_model(
+                 "/game/{session_id}/question", GameQuestionResponse(**question)),
+             lambda: through_response_model("/game/{session_id}/question", question),
+             lambda: FastJSONResponse(question).body),
+            ("GET /progress/leaderboard", len(entries),
+             lambda: through_response_model(
+                 "/progress/leaderboard", [LeaderboardEntry(**e) for e in entries]),
+             lambda: through_response_model("/progress/leaderboard", entries),
+             lambda: FastJSONResponse(entries).body),
+        ]
+
+        for name, items, models, dicts, fast in cases:
+            # Every path has to produce the same document
+            expected = json.loads(await call(models))
+            for fn in (dicts, fast):
+                if fn is not None:
+                    assert json.loads(await call(fn)) == expected, name
+
+            timings = [
+                None if fn is None else await per_call(fn, args.seconds)
+                for fn in (models, dicts, fast)
+            ]
+            cells = ["-" if t is None else f"{t * 1e6:.1f}us" for t in timings]
+            print(f"{name:<28} {size:>6} {items:>6} {cells[0]:>10} {cells[1]:>10} {cells[2]:>10} "
+                  f"{timings[0] / timings[2]:>7.1f}x")
+
+
+def main():
+    args = parse_args()
+    try:
+        import orjson  # noqa: F401
+    except ImportError:
+        sys.exit("The orjson package is needed for this benchmark")
+
+    use_backend(args.backend)
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
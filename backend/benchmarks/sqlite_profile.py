@@ -0,0 +1,172 @@
+"""
+Concurrent read/write benchmark for the SQLite engine profiles
+
+Runs reader and writer threads against a throwaway database for each
+SQLITE_PROFILE (each in its own process, since the profile is read at
+import time). Writers run the answer path's statements, readers the
+/progress aggregate:
+
+    cd backend
+    python -m benchmarks.sqlite_profile --seconds 10 --readers 4 --writers 4
+"""
+
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+from typing import List
+
+from benchmarks.common import BACKEND_DIR, migrate_database, percentile, use_backend
+
+WRITE_SQL = [
+    "UPDATE game_sessions SET correct_answers = correct_answers + 1 WHERE id = :user_id",
+    "INSERT INTO user_progress (user_id, term_id, times_seen, times_correct, mastered, box, due_at) "
+    "VALUES (:user_id, :term_id, 1, 1, 0, 1, 0) "
+    "ON CONFLICT (user_id, term_id) DO UPDATE SET times_seen = times_seen + 1, "
+    "times_correct = times_correct + 1, last_seen_at = CURRENT_TIMESTAMP",
+    "UPDATE users SET total_xp = total_xp + 10, current_streak = current_streak + 1 "
+    "WHERE id = :user_id",
+]
+READ_SQL = (
+    "SELECT terms.category, SUM(user_progress.mastered), SUM(user_progress.times_correct), "
+    "SUM(user_progress.times_seen) FROM user_progress JOIN terms ON terms.id = user_progress.term_id "
+    "WHERE user_progress.user_id = :user_id GROUP BY terms.category"
+)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--terms", type=int, default=500)
+    parser.add_argument("--profiles", default="default,tuned")
+    parser.add_argument("--backend", default=BACKEND_DIR)
+    parser.add_argument("--run-profile", help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+
+def seed(engine, users: int, terms: int):
+    from sqlalchemy import text
+
+    rng = random.Random(1)
+    with engine.begin() as conn:
+        conn.execute(text(
+            "INSERT INTO terms (name, definition, category, difficulty, real_world_example) "
+            "VALUES (:name, 'definition', :category, 'beginner', 'example')"
+        ), [{"name": f"term{i}", "category": f"cat{i % 5}"} for i in range(terms)])
+        conn.execute(text(
+            "INSERT INTO users (email, username, hashed_password, total_xp, current_streak) "
+            "VALUES (:email, :username, 'x', 0, 0)"
+        ), [{"email": f"u{i}@example.com", "username": f"u{i}"} for i in range(users)])
+        conn.execute(text(
+            "INSERT INTO game_sessions (user_id, total_questions, correct_answers, xp_earned, completed) "
+            "VALUES (:user_id, 5, 0, 0, 0)"
+        ), [{"user_id": i + 1} for i in range(users)])
+        conn.execute(text(
+            "INSERT OR IGNORE INTO user_progress (user_id, term_id, times_seen, times_correct, mastered, box, due_at) "
+            "VALUES (:user_id, :term_id, 1, 0, 0, 0, 0)"
+        ), [
+            {"user_id": u + 1, "term_id": rng.randrange(terms) + 1}
+            for u in range(users) for _ in range(20)
+        ])
+
+
+def run_profile(args) -> dict:
+    use_backend(args.backend)
+
+    from sqlalchemy import text
+    from sqlalchemy.exc import OperationalError
+
+    from database import engine
+
+    migrate_database()
+    seed(engine, args.users, args.terms)
+    engine.dispose()
+
+    deadline = time.perf_counter() + args.seconds
+    lock = threading.Lock()
+    stats = {"reads": 0, "writes": 0, "errors": 0}
+    write_latencies: List[float] = []
+    read_latencies: List[float] = []
+
+    def writer(seed_value: int):
+        rng = random.Random(seed_value)
+        statements = [text(sql) for sql in WRITE_SQL]
+        while time.perf_counter() < deadline:
+            params = {"user_id": rng.randrange(args.users) + 1, "term_id": rng.randrange(args.terms) + 1}
+            start = time.perf_counter()
+            try:
+                with engine.begin() as conn:
+                    for statement in statements:
+                        conn.execute(statement, params)
+            except OperationalError:
+                with lock:
+                    stats["errors"] += 1
+                continue
+            with lock:
+                stats["writes"] += 1
+                write_latencies.append(time.perf_counter() - start)
+
+    def reader(seed_value: int):
+        rng = random.Random(seed_value)
+        statement = text(READ_SQL)
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                with engine.connect() as conn:
+                    conn.execute(statement, {"user_id": rng.randrange(args.users) + 1}).all()
+            except OperationalError:
+                with lock:
+                    stats["errors"] += 1
+                continue
+            with lock:
+                stats["reads"] += 1
+                read_latencies.append(time.perf_counter() - start)
+
+    threads = [threading.Thread(target=writer, args=(i,)) for i in range(args.writers)]
+    threads += [threading.Thread(target=reader, args=(100 + i,)) for i in range(args.readers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    write_latencies.sort()
+    read_latencies.sort()
+    return {
+        "writes_per_s": round(stats["writes"] / args.seconds, 1),
+        "reads_per_s": round(stats["reads"] / args.seconds, 1),
+        "errors": stats["errors"],
+        "write_p99_ms": round(percentile(write_latencies, 99) * 1000, 2),
+        "read_p99_ms": round(percentile(read_latencies, 99) * 1000, 2),
+    }
+
+
+def main():
+    args = parse_args()
+    if args.run_profile:
+        print(json.dumps(run_profile(args)))
+        return
+
+    print(f"{'profile':<10} {'writes/s':>10} {'reads/s':>10} {'errors':>7} {'w p99':>9} {'r p99':>9}")
+    for profile in args.profiles.split(","):
+        output = subprocess.run(
+            [sys.executable, "-m", "benchmarks.sqlite_profile", *sys.argv[1:], "--run-profile", profile],
+            env={**os.environ, "SQLITE_PROFILE": profile},
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+            capture_output=True, text=True, check=True,
+        ).stdout
+        r = json.loads(output.strip().splitlines()[-1])
+        print(
+            f"{profile:<10} {r['writes_per_s']:>10} {r['reads_per_s']:>10} {r['errors']:>7} "
+            f"{r['write_p99_ms']:>9} {r['read_p99_ms']:>9}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Startup time: from process start to the first 200 on /health
+
+Prepares a throwaway database once (migrations, then either the seed
+terms or --terms synthetic ones, and the distractor index), then starts
+`uvicorn main:app` --runs times and polls /health:
+
+    cd backend
+    python -m benchmarks.startup --runs 5 --terms 10000
+
+Use --backend to point at another checkout of backend/ to compare commits.
+"""
+
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+from benchmarks.common import BACKEND_DIR, migrate_database, prepare_database, use_backend
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--terms", type=int, default=0, help="Synthetic terms instead of the seed")
+    parser.add_argument("--timeout", type=float, default=60, help="Seconds to wait per run")
+    parser.add_argument("--backend", default=BACKEND_DIR)
+    return parser.parse_args()
+
+
+def add_terms(count: int):
+    from sqlalchemy import insert
+
+    from database import SessionLocal
+    from models import Term
+
+    db = SessionLocal()
+    try:
+        db.execute(insert(Term), [
+            {
+                "name": f"Startup Term {i}",
+                "definition": f"Synthetic definition number {i} used for startup timing.",
+                "category": "Architecture",
+                "difficulty": "beginner",
+                "real_world_example": f"Synthetic example {i}.",
+            }
+            for i in range(count)
+        ])
+        db.commit()
+    finally:
+        db.close()
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def time_to_first_health(backend: str, timeout: float) -> float:
+    port = free_port()
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        env={**os.environ, "PYTHONPATH": os.path.abspath(backend)},
+    )
+    try:
+        while time.perf_counter() - started < timeout:
+            if process.poll() is not None:
+                raise RuntimeError(f"uvicorn exited with status {process.returncode}")
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout=1) as response:
+                    if response.status == 200:
+                        return time.perf_counter() - started
+            except (urllib.error.URLError, ConnectionError):
+                pass
+            time.sleep(0.005)
+        raise RuntimeError(f"/health did not answer within {timeout}s")
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def main():
+    args = parse_args()
+
+    use_backend(args.backend)
+
+    from database import engine
+
+    migrate_database()
+    if args.terms:
+        add_terms(args.terms)
+    prepare_database()  # seeds only an empty database, then builds the distractor index
+    engine.dispose()
+
+    times = [time_to_first_health(args.backend, args.timeout) for _ in range(args.runs)]
+
+    print(f"{args.runs} runs, process start to first 200 on /health")
+    print(f"  min    {min(times) * 1000:8.1f} ms")
+    print(f"  median {statistics.median(times) * 1000:8.1f} ms")
+    print(f"  max    {max(times) * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+In-memory term catalog used for question generation
+"""
+
+import random
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import datetime
+from itertools import groupby
+from operator import itemgetter
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from models import Term, TermDistractor
+
+
+@dataclass(frozen=True)
+class CatalogTerm:
+    id: int
+    name: str
+    definition: str
+    category: str
+    difficulty: str
+    code_example: Optional[str]
+    real_world_example: str
+    created_at: datetime
+
+
+class TermCatalog:
+    """Immutable snapshot of the terms table indexed by (category, difficulty)"""
+
+    def __init__(
+        self,
+        terms: List[CatalogTerm],
+        version: int = 0,
+        distractors: Optional[Dict[int, Tuple[int, ...]]] = None
+    ):
+        self.version = version
+        self.by_id: Dict[int, CatalogTerm] = {t.id: t for t in terms}
+        self._distractors = distractors or {}
+
+        # Every term is reachable through the unfiltered, category-only,
+        # difficulty-only and exact keys, so any filter is a single lookup
+        index = defaultdict(list)
+        for t in terms:
+            index[(None, None)].append(t)
+            index[(t.category, None)].append(t)
+            index[(None, t.difficulty)].append(t)
+            index[(t.category, t.difficulty)].append(t)
+
+        self._index: Dict[Tuple[Optional[str], Optional[str]], Tuple[CatalogTerm, ...]] = {
+            key: tuple(value) for key, value in index.items()
+        }
+        self.categories: Tuple[str, ...] = tuple(sorted(
+            category for category, difficulty in self._index
+            if category is not None and difficulty is None
+        ))
+
+    def __len__(self) -> int:
+        return len(self.by_id)
+
+    def get(self, term_id: int) -> Optional[CatalogTerm]:
+        return self.by_id.get(term_id)
+
+    def distractors(self, term_id: int) -> Tuple[int, ...]:
+        """Precomputed confusable term ids, best first (see distractors.py)"""
+        return self._distractors.get(term_id, ())
+
+    def pool(
+        self,
+        category: Optional[str] = None,
+        difficulty: Optional[str] = None
+    ) -> Tuple[CatalogTerm, ...]:
+        """Return all terms matching the filter (empty filters match everything)"""
+        return self._index.get((category or None, difficulty or None), ())
+
+    def sample(
+        self,
+        count: int,
+        category: Optional[str] = None,
+        difficulty: Optional[str] = None,
+        rng: random.Random = random
+    ) -> List[CatalogTerm]:
+        """
+        Pick `count` distinct terms from the filtered pool.
+        Cost depends on `count` only, not on the size of the pool.
+        """
+        pool = self.pool(category, difficulty)
+        if len(pool) < count:
+            raise ValueError("Not enough terms")
+
+        return [pool[i] for i in rng.sample(range(len(pool)), count)]
+
+
+_catalog = TermCatalog([])
+
+
+def get_catalog() -> TermCatalog:
+    """Return the current catalog snapshot"""
+    return _catalog
+
+
+def load_catalog(db: Session) -> TermCatalog:
+    """Rebuild the catalog from the terms table and swap it in"""
+    global _catalog
+
+    columns = (
+        Term.id, Term.name, Term.definition, Term.category, Term.difficulty,
+        Term.code_example, Term.real_world_example, Term.created_at,
+    )
+    rows = db.execute(select(*columns).order_by(Term.id)).all()
+
+    # DISTRACTOR_K rows per term: read through the DB-API cursor, which
+    # skips building a SQLAlchemy Row for each and is what startup waits on
+    statement = select(TermDistractor.term_id, TermDistractor.distractor_id) \
+        .order_by(TermDistractor.term_id, TermDistractor.rank)
+    result = db.connection().execute(statement)
+    try:
+        pairs = result.cursor.fetchall()
+    finally:
+        result.close()
+
+    _catalog = TermCatalog(
+        [CatalogTerm(*row) for row in rows],  # columns are in field order
+        version=_catalog.version + 1,
+        distractors={
+            term_id: tuple(pair[1] for pair in group)
+            for term_id, group in groupby(pairs, itemgetter(0))
+        },
+    )
+    return _catalog
@@ -0,0 +1,153 @@
+"""
+Per-session question decks, drawn once when a game starts and kept in the
+shared state so any worker can serve the next question
+"""
+
+import json
+import random
+from dataclasses import dataclass
+from typing import List, Optional, Sequence, Tuple
+
+from catalog import CatalogTerm, TermCatalog
+from scheduler import UserSchedule, now_seconds
+from state import SharedState, shared_state
+
+DECK_TTL_SECONDS = 60 * 60
+
+
+@dataclass(frozen=True)
+class DeckQuestion:
+    term_id: int
+    options: Tuple[str, ...]
+
+
+@dataclass
+class Deck:
+    user_id: int
+    questions: Tuple[DeckQuestion, ...]
+    position: int = 0
+
+
+def _in_pool(term: Optional[CatalogTerm], category: Optional[str], difficulty: Optional[str]) -> bool:
+    return term is not None \
+        and (not category or term.category == category) \
+        and (not difficulty or term.difficulty == difficulty)
+
+
+def _pick_terms(
+    catalog: TermCatalog,
+    category: Optional[str],
+    difficulty: Optional[str],
+    size: int,
+    rng: random.Random,
+    schedule: Optional[UserSchedule]
+) -> List[CatalogTerm]:
+    """Due reviews first, then terms the user has never seen, then any others"""
+    pool = catalog.pool(category, difficulty)
+    size = min(size, len(pool))
+    if schedule is None:
+        return catalog.sample(size, category, difficulty, rng=rng)
+
+    def in_pool(term_id: int) -> bool:
+        return _in_pool(catalog.get(term_id), category, difficulty)
+
+    picked = [catalog.get(term_id) for term_id in schedule.due(now_seconds(), size, in_pool)]
+    if len(picked) < size:
+        # A bounded random draw keeps this independent of the pool size
+        taken = {t.id for t in picked}
+        candidates = [
+            t for t in catalog.sample(min(len(pool), size * 4), category, difficulty, rng=rng)
+            if t.id not in taken
+        ]
+        candidates.sort(key=lambda t: t.id in schedule)  # stable: unseen first
+        picked += candidates[:size - len(picked)]
+
+    return picked
+
+
+def build_deck(
+    catalog: TermCatalog,
+    session_id: int,
+    user_id: int,
+    category: Optional[str],
+    difficulty: Optional[str],
+    size: int,
+    schedule: Optional[UserSchedule] = None,
+    term_ids: Optional[Sequence[int]] = None
+) -> Deck:
+    """
+    Draw `size` distinct questions (fewer if the pool is smaller), led by
+    the reviews due in the user's schedule when one is given.
+    Rebuilding an evicted deck passes the `term_ids` drawn at the start
+    instead; the options of each question are seeded by the session and
+    term, so they come out the same against the same catalog.
+    """
+    rng = random.Random(session_id)
+    pool = catalog.pool(category, difficulty)
+    if len(pool) < 4:
+        raise ValueError("Not enough terms")
+
+    if term_ids is None:
+        term_ids = [t.id for t in _pick_terms(catalog, category, difficulty, size, rng, schedule)]
+
+    questions = []
+    for term_id in term_ids:
+        term = catalog.get(term_id)
+        if term is None:
+            # Removed from the catalog since the draw; skipped when served
+            questions.append(DeckQuestion(term_id=term_id, options=()))
+            continue
+
+        rng = random.Random(f"{session_id}:{term.id}")
+        # Three of the term's closest look-alikes within the session's pool,
+        # topped up at random from the pool when the index has fewer (e.g.
+        # terms added since the last rebuild)
+        near = [
+            t for t in map(catalog.get, catalog.distractors(term.id))
+            if _in_pool(t, category, difficulty)
+        ]
+        others = rng.sample(near, min(3, len(near)))
+        if len(others) < 3:
+            taken = {term.id} | {t.id for t in others}
+            others += [
+                t for t in catalog.sample(min(6, len(pool)), category, difficulty, rng=rng) if t.id not in taken
+            ][:3 - len(others)]
+        options = [t.name for t in others] + [term.name]
+        rng.shuffle(options)
+        questions.append(DeckQuestion(term_id=term.id, options=tuple(options)))
+
+    return Deck(user_id=user_id, questions=tuple(questions))
+
+
+class DeckStore:
+    """Decks keyed by session id in the shared state, evicted after DECK_TTL_SECONDS idle"""
+
+    def __init__(self, state: SharedState = shared_state, ttl: float = DECK_TTL_SECONDS):
+        self.state = state
+        self.ttl = ttl
+
+    async def put(self, session_id: int, deck: Deck):
+        """Store the deck, including its position (call again after advancing it)"""
+        value = json.dumps([
+            deck.user_id, deck.position,
+            [[q.term_id, q.options] for q in deck.questions],
+        ], separators=(",", ":"))
+        await self.state.set(f"deck:{session_id}", value, self.ttl)
+
+    async def get(self, session_id: int) -> Optional[Deck]:
+        value = await self.state.get(f"deck:{session_id}", ttl=self.ttl)
+        if value is None:
+            return None
+
+        user_id, position, questions = json.loads(value)
+        return Deck(
+            user_id=user_id,
+            questions=tuple(DeckQuestion(term_id, tuple(options)) for term_id, options in questions),
+            position=position,
+        )
+
+    async def discard(self, session_id: int):
+        await self.state.delete(f"deck:{session_id}")
+
+
+deck_store = DeckStore()
@@ -0,0 +1,262 @@
+"""
+Precomputed distractor index for multiple-choice questions
+
+For every term, the DISTRACTOR_K most confusable other terms are stored in
+term_distractors, ranked by TF-IDF cosine similarity of name + definition
+plus a bonus for sharing the category and the difficulty. Question
+generation then reads distractors from the catalog instead of drawing
+random names.
+
+A full rebuild is O(n^2) and meant to run offline:
+
+    python distractors.py
+
+Imports call update_distractors() with the changed term ids, which only
+scores those terms against the rest (O(changed * n)).
+"""
+
+import re
+import time
+from collections import Counter
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy import Engine, delete, func, insert, select
+
+from database import engine
+from models import Term, TermDistractor
+
+DISTRACTOR_K = 8
+CATEGORY_WEIGHT = 1.0
+DIFFICULTY_WEIGHT = 0.25
+
+# Vocabulary cap; bounds the term matrix at about n x MAX_FEATURES float32
+MAX_FEATURES = 1024
+# Rows scored per matrix product; bounds the score block at BLOCK_ROWS x n
+BLOCK_ROWS = 512
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_STOP_WORDS = frozenset(
+    "a an and are as at be by can for from in into is it its of on or that "
+    "the their them this to used uses using which with".split()
+)
+
+
+# =========================
+# VECTORS
+# =========================
+
+class TermVectors:
+    """L2-normalised TF-IDF rows plus weighted category/difficulty columns, in id order"""
+
+    def __init__(self, rows: Sequence[Tuple[int, str, str, str, str]]):
+        self.ids = np.array([row[0] for row in rows], dtype=np.int64)
+        self.position = {int(term_id): i for i, term_id in enumerate(self.ids)}
+
+        docs = [self._tokens(name, definition) for _, name, definition, _, _ in rows]
+        df = Counter(token for doc in docs for token in set(doc))
+        # Tokens in a single term cannot relate two terms; tokens in most
+        # terms do not tell them apart
+        common = [
+            token for token, count in df.most_common()
+            if count > 1 and count <= max(2, len(docs) // 2)
+        ][:MAX_FEATURES]
+        vocab = {token: i for i, token in enumerate(common)}
+
+        self.matrix = np.zeros((len(docs), len(vocab)), dtype=np.float32)
+        for i, doc in enumerate(docs):
+            for token in doc:
+                j = vocab.get(token)
+                if j is not None:
+                    self.matrix[i, j] += 1
+
+        idf = np.array(
+            [np.log((1 + len(docs)) / (1 + df[token])) + 1 for token in common],
+            dtype=np.float32,
+        )
+        self.matrix *= idf
+        norms = np.linalg.norm(self.matrix, axis=1, keepdims=True)
+        np.divide(self.matrix, norms, out=self.matrix, where=norms > 0)
+
+        # Category and difficulty become one-hot columns scaled by the root
+        # of their weight, so a single matrix product yields the full score
+        self.matrix = np.hstack([
+            self.matrix,
+            self._one_hot((row[3] for row in rows), CATEGORY_WEIGHT),
+            self._one_hot((row[4] for row in rows), DIFFICULTY_WEIGHT),
+        ])
+
+    @staticmethod
+    def _tokens(name: str, definition: str) -> List[str]:
+        return [
+            token for token in _TOKEN_RE.findall(f"{name} {definition}".lower())
+            if len(token) > 1 and token not in _STOP_WORDS
+        ]
+
+    @staticmethod
+    def _one_hot(values: Iterable[str], weight: float) -> np.ndarray:
+        codes: Dict[str, int] = {}
+        column = np.array([codes.setdefault(v, len(codes)) for v in values], dtype=np.int64)
+        one_hot = np.zeros((len(column), len(codes)), dtype=np.float32)
+        one_hot[np.arange(len(column)), column] = np.sqrt(weight)
+        return one_hot
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def scores(self, rows: np.ndarray) -> np.ndarray:
+        """Similarity of the terms at positions `rows` to every term"""
+        scores = self.matrix[rows] @ self.matrix.T
+        scores[np.arange(len(rows)), rows] = -np.inf  # never a distractor for itself
+        return scores
+
+
+def _load_vectors(conn) -> TermVectors:
+    rows = conn.execute(
+        select(Term.id, Term.name, Term.definition, Term.category, Term.difficulty)
+        .order_by(Term.id)
+    ).all()
+    return TermVectors(rows)
+
+
+def _top_k(vectors: TermVectors, rows: np.ndarray, k: int) -> Dict[int, List[Tuple[int, float]]]:
+    """Best k (distractor id, score) per term at positions `rows`"""
+    k = min(k, len(vectors) - 1)
+    result: Dict[int, List[Tuple[int, float]]] = {}
+    if k <= 0:
+        return result
+
+    for start in range(0, len(rows), BLOCK_ROWS):
+        block = rows[start:start + BLOCK_ROWS]
+        scores = np.negative(vectors.scores(block))
+        best = np.argpartition(scores, k - 1, axis=1)[:, :k]
+        best_scores = -np.take_along_axis(scores, best, axis=1)
+        order = np.argsort(-best_scores, axis=1, kind="stable")
+
+        for i, row in enumerate(block):
+            result[int(vectors.ids[row])] = [
+                (int(vectors.ids[best[i, j]]), float(best_scores[i, j])) for j in order[i]
+            ]
+    return result
+
+
+def _write(conn, neighbours: Dict[int, List[Tuple[int, float]]], replace_all: bool = False):
+    if replace_all:
+        conn.execute(delete(TermDistractor))
+    else:
+        term_ids = list(neighbours)
+        # Chunked to stay under SQLite's bound-parameter limit
+        for start in range(0, len(term_ids), 500):
+            conn.execute(delete(TermDistractor).where(
+                TermDistractor.term_id.in_(term_ids[start:start + 500])
+            ))
+
+    values = [
+        {"term_id": term_id, "rank": rank, "distractor_id": distractor_id, "score": score}
+        for term_id, ranked in neighbours.items()
+        for rank, (distractor_id, score) in enumerate(ranked)
+    ]
+    if values:
+        conn.execute(insert(TermDistractor), values)
+
+
+def _rebuild(conn, vectors: TermVectors, k: int) -> int:
+    neighbours = _top_k(vectors, np.arange(len(vectors)), k)
+    _write(conn, neighbours, replace_all=True)
+    return len(neighbours)
+
+
+# =========================
+# BUILD / UPDATE
+# =========================
+
+def rebuild_distractors(bind: Engine = engine, k: int = DISTRACTOR_K) -> int:
+    """Recompute the whole index; returns the number of terms indexed"""
+    with bind.begin() as conn:
+        return _rebuild(conn, _load_vectors(conn), k)
+
+
+def needs_rebuild(changed: int, total: int) -> bool:
+    """Whether `changed` of `total` terms are mostly new, so only a full rebuild pays off"""
+    return changed * 2 >= total
+
+
+def update_distractors(
+    changed_ids: Iterable[int],
+    bind: Engine = engine,
+    k: int = DISTRACTOR_K
+) -> int:
+    """
+    Refresh the index after `changed_ids` were inserted or edited.
+    Changed terms, and terms that listed one of them, get a fresh top-k;
+    every other term only merges in changed terms that now beat its worst
+    entry. Returns the number of terms whose list was rewritten.
+    """
+    with bind.begin() as conn:
+        vectors = _load_vectors(conn)
+        changed = np.array(sorted(
+            vectors.position[i] for i in set(changed_ids) if i in vectors.position
+        ), dtype=np.int64)
+        if not len(changed):
+            return 0
+
+        if needs_rebuild(len(changed), len(vectors)):
+            # Mostly new terms: scoring everything once is cheaper
+            return _rebuild(conn, vectors, k)
+
+        changed_set = set(vectors.ids[changed].tolist())
+        current: Dict[int, List[Tuple[int, float]]] = {}
+        for term_id, distractor_id, score in conn.execute(
+            select(TermDistractor.term_id, TermDistractor.distractor_id, TermDistractor.score)
+            .order_by(TermDistractor.term_id, TermDistractor.rank)
+        ):
+            current.setdefault(term_id, []).append((distractor_id, score))
+
+        # Lists that mention a changed term may hold a stale score for it
+        stale = [
+            vectors.position[term_id] for term_id, ranked in current.items()
+            if term_id in vectors.position
+            and any(distractor_id in changed_set for distractor_id, _ in ranked)
+        ]
+        recompute = np.union1d(changed, np.array(stale, dtype=np.int64))
+        neighbours = _top_k(vectors, recompute, k)
+
+        k = min(k, len(vectors) - 1)
+        worst = np.full(len(vectors), -np.inf, dtype=np.float32)
+        for term_id, ranked in current.items():
+            if term_id in vectors.position and len(ranked) >= k:
+                worst[vectors.position[term_id]] = ranked[-1][1]
+        worst[recompute] = np.inf  # already fresh
+
+        # Scores are symmetric: a changed term's row holds its score as a
+        # candidate for every other term
+        for start in range(0, len(changed), BLOCK_ROWS):
+            block = changed[start:start + BLOCK_ROWS]
+            scores = vectors.scores(block)
+            for i, other in zip(*np.nonzero(scores > worst)):
+                other_id = int(vectors.ids[other])
+                candidate = (int(vectors.ids[block[i]]), float(scores[i, other]))
+                ranked = sorted(current.get(other_id, []) + [candidate], key=lambda e: -e[1])[:k]
+                current[other_id] = neighbours[other_id] = ranked
+                if len(ranked) >= k:
+                    worst[other] = ranked[-1][1]
+
+        _write(conn, neighbours)
+    return len(neighbours)
+
+
+def index_is_empty(bind: Engine = engine) -> bool:
+    """True when terms exist but none has distractors yet"""
+    with bind.connect() as conn:
+        terms = conn.scalar(select(func.count()).select_from(Term))
+        indexed = conn.scalar(select(func.count()).select_from(TermDistractor))
+    return terms > 0 and indexed == 0
+
+
+if __name__ == "__main__":
+    from migrations import upgrade
+    upgrade()
+
+    start = time.perf_counter()
+    count = rebuild_distractors()
+    print(f"Indexed distractors for {count} terms in {time.perf_counter() - start:.2f}s")
@@ -0,0 +1,139 @@
+"""
+In-process pub/sub for the Server-Sent Events stream (GET /events)
+
+Every connection gets a small bounded queue. Events are serialized once
+per publish and only referenced from each queue; a client that falls
+EVENT_QUEUE_SIZE events behind is dropped, and its EventSource reconnects
+and starts again from a fresh snapshot.
+"""
+
+import asyncio
+import json
+import os
+from collections import defaultdict
+from typing import Any, AsyncIterator, Dict, Optional, Set
+
+EVENT_QUEUE_SIZE = int(os.getenv("EVENT_QUEUE_SIZE", "32"))
+EVENT_KEEPALIVE_SECONDS = float(os.getenv("EVENT_KEEPALIVE_SECONDS", "15"))
+LEADERBOARD_EVENT_SIZE = 10  # entries per leaderboard event, as GET /progress/leaderboard
+
+KEEPALIVE = b": keepalive\n\n"
+
+
+def format_event(event: str, data: Any) -> bytes:
+    """One SSE message"""
+    return f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n".encode()
+
+
+class Subscription:
+    __slots__ = ("user_id", "queue", "dropped")
+
+    def __init__(self, user_id: int, queue_size: int):
+        self.user_id = user_id
+        self.queue: "asyncio.Queue[Optional[bytes]]" = asyncio.Queue(queue_size)
+        self.dropped = False
+
+
+class EventBroker:
+    """Connections by user id; events go to one user or to everyone"""
+
+    def __init__(self, queue_size: int = EVENT_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._by_user: Dict[int, Set[Subscription]] = defaultdict(set)
+        self._last: Dict[str, Any] = {}
+        self.connections = 0
+        self.dropped = 0
+
+    def __len__(self) -> int:
+        return self.connections
+
+    def subscribe(self, user_id: int) -> Subscription:
+        subscription = Subscription(user_id, self.queue_size)
+        self._by_user[user_id].add(subscription)
+        self.connections += 1
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        subscriptions = self._by_user.get(subscription.user_id)
+        if subscriptions is None or subscription not in subscriptions:
+            return
+        subscriptions.discard(subscription)
+        if not subscriptions:
+            del self._by_user[subscription.user_id]
+        self.connections -= 1
+
+    def has_subscribers(self, user_id: Optional[int] = None) -> bool:
+        return user_id in self._by_user if user_id is not None else bool(self._by_user)
+
+    def publish_changed(self, event: str, data: Any):
+        """Publish to everyone, unless `data` is what was last sent for `event`"""
+        if self._last.get(event) == data:
+            return
+        self._last[event] = data
+        self.publish(event, data)
+
+    def publish(self, event: str, data: Any, user_id: Optional[int] = None):
+        """Queue an event for one user's connections, or for all of them"""
+        if user_id is None:
+            targets = [s for subscriptions in self._by_user.values() for s in subscriptions]
+        else:
+            targets = list(self._by_user.get(user_id, ()))
+        if not targets:
+            return
+
+        message = format_event(event, data)
+        for subscription in targets:
+            self._deliver(subscription, message)
+
+    def _deliver(self, subscription: Subscription, message: bytes):
+        if subscription.dropped:
+            return
+        try:
+            subscription.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            # Slow consumer: free its backlog and end the stream
+            self.dropped += 1
+            self._end(subscription)
+
+    def _end(self, subscription: Subscription):
+        subscription.dropped = True
+        while not subscription.queue.empty():
+            subscription.queue.get_nowait()
+        subscription.queue.put_nowait(None)
+        self.unsubscribe(subscription)
+
+    def keepalive(self):
+        """
+        Queue a comment line on every connection: keeps proxies from timing
+        out idle streams, and fills up (so drops) the queues of dead ones
+        """
+        for subscriptions in list(self._by_user.values()):
+            for subscription in list(subscriptions):
+                self._deliver(subscription, KEEPALIVE)
+
+    def close_all(self):
+        """End every stream (on shutdown)"""
+        for subscriptions in list(self._by_user.values()):
+            for subscription in list(subscriptions):
+                self._end(subscription)
+
+    async def stream(self, subscription: Subscription) -> AsyncIterator[bytes]:
+        """Yield queued messages until the subscription is dropped"""
+        try:
+            while True:
+                message = await subscription.queue.get()
+                if message is None:
+                    return
+                yield message
+        finally:
+            self.unsubscribe(subscription)
+
+
+async def keepalive_periodically(broker: "EventBroker", interval: float = EVENT_KEEPALIVE_SECONDS):
+    # One timer for all connections, rather than a timeout per idle stream
+    while True:
+        await asyncio.sleep(interval)
+        broker.keepalive()
+
+
+event_broker = EventBroker()
@@ -0,0 +1,46 @@
+"""
+Opt-in fast path for JSON responses
+
+Enable with TECHLINGO_FAST_JSON=1 (needs orjson). Routes that build their
+payload from catalog terms, rows or leaderboard tuples then send it
+serialized by orjson in one pass, instead of FastAPI validating it
+against response_model and encoding it again; response_model still
+documents the shape in OpenAPI. Without it those routes return the same
+plain dicts and FastAPI validates them as usual.
+"""
+
+import os
+from typing import Any, Sequence
+
+from fastapi.responses import ORJSONResponse
+
+from catalog import CatalogTerm
+
+try:
+    import orjson
+except ImportError:  # optional, only needed for TECHLINGO_FAST_JSON=1
+    orjson = None
+
+FAST_JSON_ENABLED = os.getenv("TECHLINGO_FAST_JSON", "0") == "1"
+if FAST_JSON_ENABLED and orjson is None:
+    raise RuntimeError("TECHLINGO_FAST_JSON=1 needs the orjson package")
+
+
+class FastJSONResponse(ORJSONResponse):
+    """ORJSONResponse writing UTC datetimes with a `Z`, the way Pydantic does"""
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(
+            content, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_UTC_Z
+        )
+
+
+def respond(content: Any):
+    """`content` serialized by orjson on the fast path, else as is for response_model"""
+    return FastJSONResponse(content) if FAST_JSON_ENABLED else content
+
+
+def dump_terms(terms: Sequence[CatalogTerm]) -> bytes:
+    """Catalog terms as a JSON array of TermResponse objects"""
+    # CatalogTerm has the fields of TermResponse, in the same order
+    return orjson.dumps(list(terms), option=orjson.OPT_UTC_Z)
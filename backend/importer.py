@@ -0,0 +1,193 @@
+"""
+Streaming bulk import of terms from JSONL or CSV
+
+Rows are validated against TermCreate and upserted on name in chunks, so
+memory stays bounded by the chunk size whatever the file size. Re-running
+an import only rewrites terms whose content changed:
+
+    python importer.py terms.jsonl
+    python importer.py terms.csv --chunk-size 5000
+"""
+
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from pydantic import ValidationError
+from sqlalchemy import Engine, or_
+
+from database import engine, upsert
+from distractors import update_distractors
+from models import Term
+from schemas import TermCreate
+
+IMPORT_CHUNK_SIZE = 1000
+# Rejected rows kept in the report; the rest are only counted
+MAX_REPORTED_REJECTS = 100
+
+FORMATS = ("jsonl", "csv")
+TERM_CONTENT = ("definition", "category", "difficulty", "code_example", "real_world_example")
+
+
+@dataclass
+class ImportReport:
+    rows_read: int = 0
+    written: int = 0
+    unchanged: int = 0
+    rejected_count: int = 0
+    rejected: List[Tuple[int, str]] = field(default_factory=list)
+    # Ids of inserted or updated terms, for the distractor index
+    changed_ids: List[int] = field(default_factory=list)
+    distractors_updated: int = 0
+    elapsed_seconds: float = 0.0
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows_read / self.elapsed_seconds if self.elapsed_seconds else 0.0
+
+    def reject(self, line: int, reason: str):
+        self.rejected_count += 1
+        if len(self.rejected) < MAX_REPORTED_REJECTS:
+            self.rejected.append((line, reason))
+
+
+def detect_format(filename: Optional[str]) -> str:
+    """jsonl unless the file name ends in .csv"""
+    if filename and filename.lower().endswith(".csv"):
+        return "csv"
+    return "jsonl"
+
+
+def iter_rows(lines: Iterable[str], fmt: str) -> Iterator[Tuple[int, Any]]:
+    """
+    Yield (line number, raw row) lazily. Rows that cannot be parsed are
+    yielded as the exception so the caller can reject them.
+    """
+    if fmt == "csv":
+        reader = csv.DictReader(lines)
+        for row in reader:
+            # Empty cells mean "not set" for optional columns
+            yield reader.line_num, {k: v for k, v in row.items() if k and v != ""}
+        return
+
+    for number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            yield number, json.loads(line)
+        except ValueError as exc:
+            yield number, exc
+
+
+def _upsert_statement():
+    stmt = upsert(Term)
+    excluded = stmt.excluded
+    # The WHERE clause skips the write entirely when nothing changed, which
+    # keeps re-runs cheap and leaves the FTS triggers alone
+    return stmt.on_conflict_do_update(
+        index_elements=[Term.name],
+        set_={name: getattr(excluded, name) for name in TERM_CONTENT},
+        where=or_(*(
+            getattr(Term, name).is_distinct_from(getattr(excluded, name))
+            for name in TERM_CONTENT
+        )),
+    )
+
+
+def _flush(bind: Engine, chunk: Dict[str, Dict[str, Any]], report: ImportReport):
+    if not chunk:
+        return
+    with bind.begin() as conn:
+        # Unchanged rows are skipped by the upsert, so only written ids come back
+        written = conn.execute(
+            _upsert_statement().returning(Term.id), list(chunk.values())
+        ).scalars().all()
+    report.written += len(written)
+    report.unchanged += len(chunk) - len(written)
+    report.changed_ids.extend(written)
+    chunk.clear()
+
+
+def import_terms(
+    lines: Iterable[str],
+    fmt: str = "jsonl",
+    chunk_size: int = IMPORT_CHUNK_SIZE,
+    bind: Engine = engine,
+    refresh_distractors: bool = True
+) -> ImportReport:
+    """
+    Validate and upsert terms, one transaction per chunk, then update the
+    distractor index for the terms that changed
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown import format: {fmt}")
+
+    report = ImportReport()
+    # Keyed by name so a term repeated within a chunk is written once (last wins)
+    chunk: Dict[str, Dict[str, Any]] = {}
+    start = time.perf_counter()
+
+    for line, raw in iter_rows(lines, fmt):
+        report.rows_read += 1
+        if isinstance(raw, Exception):
+            report.reject(line, f"invalid JSON: {raw}")
+            continue
+
+        try:
+            term = TermCreate.model_validate(raw)
+        except ValidationError as exc:
+            report.reject(line, "; ".join(
+                f"{'.'.join(str(p) for p in err['loc']) or 'row'}: {err['msg']}"
+                for err in exc.errors()
+            ))
+            continue
+
+        chunk[term.name] = term.model_dump()
+        if len(chunk) >= chunk_size:
+            _flush(bind, chunk, report)
+
+    _flush(bind, chunk, report)
+    if refresh_distractors and report.changed_ids:
+        report.distractors_updated = update_distractors(report.changed_ids, bind)
+
+    report.elapsed_seconds = time.perf_counter() - start
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import terms from a JSONL or CSV file")
+    parser.add_argument("path")
+    parser.add_argument("--format", choices=FORMATS, help="Default: from the file extension")
+    parser.add_argument("--chunk-size", type=int, default=IMPORT_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    from migrations import upgrade
+    upgrade()
+
+    fmt = args.format or detect_format(args.path)
+    with open(args.path, newline="", encoding="utf-8") as f:
+        report = import_terms(f, fmt, args.chunk_size)
+
+    for line, reason in report.rejected:
+        print(f"REJECTED line {line}: {reason}", file=sys.stderr)
+    if report.rejected_count > len(report.rejected):
+        print(f"... and {report.rejected_count - len(report.rejected)} more", file=sys.stderr)
+
+    print(
+        f"{report.rows_read} rows from {os.path.basename(args.path)} in "
+        f"{report.elapsed_seconds:.2f}s ({report.rows_per_second:.0f} rows/s): "
+        f"{report.written} written, {report.unchanged} unchanged, "
+        f"{report.rejected_count} rejected, "
+        f"{report.distractors_updated} distractor lists updated"
+    )
+    if report.written:
+        print("Running servers pick up the changes on POST /admin/catalog/reload")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+In-process leaderboard ranked by total XP
+"""
+
+import asyncio
+import logging
+import time
+from bisect import bisect_left, insort
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import select
+
+from database import ReadSessionLocal
+from models import User
+
+logger = logging.getLogger(__name__)
+
+LEADERBOARD_RECONCILE_SECONDS = 60
+
+
+@dataclass
+class LeaderboardRow:
+    user_id: int
+    username: str
+    total_xp: int
+    current_streak: int
+
+
+class Leaderboard:
+    """
+    Users kept sorted by (-total_xp, user_id).
+    Lookups are binary searches; an update moves one key within the list.
+    """
+
+    def __init__(self):
+        self._keys: List[Tuple[int, int]] = []
+        self._rows: Dict[int, LeaderboardRow] = {}
+        self._updated_at: Dict[int, float] = {}
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def _remove_key(self, row: LeaderboardRow):
+        i = bisect_left(self._keys, (-row.total_xp, row.user_id))
+        del self._keys[i]
+
+    def update(
+        self,
+        user_id: int,
+        total_xp: int,
+        current_streak: int,
+        username: Optional[str] = None
+    ):
+        """Record a user's new totals (username is only needed for new users)"""
+        row = self._rows.get(user_id)
+        if row is None:
+            if username is None:
+                return  # picked up by the next reconciliation
+            row = LeaderboardRow(user_id, username, total_xp, current_streak)
+        else:
+            self._remove_key(row)
+            row.total_xp = total_xp
+            row.current_streak = current_streak
+
+        insort(self._keys, (-row.total_xp, user_id))
+        self._rows[user_id] = row
+        self._updated_at[user_id] = time.monotonic()
+
+    def top(self, limit: int) -> List[Tuple[int, LeaderboardRow]]:
+        """(rank, row) of the first `limit` users, ranked as by rank()"""
+        ranked = []
+        for i, (neg_xp, user_id) in enumerate(self._keys[:max(limit, 0)]):
+            # Ties share the rank of the first user with that XP
+            rank = ranked[-1][0] if ranked and ranked[-1][1].total_xp == -neg_xp else i + 1
+            ranked.append((rank, self._rows[user_id]))
+        return ranked
+
+    def get(self, user_id: int) -> Optional[LeaderboardRow]:
+        return self._rows.get(user_id)
+
+    def rank(self, user_id: int) -> Optional[int]:
+        """1 + the number of users with strictly more XP, so ties share a rank"""
+        row = self._rows.get(user_id)
+        if row is None:
+            return None
+        return bisect_left(self._keys, (-row.total_xp,)) + 1
+
+    def replace_all(self, rows: Iterable[LeaderboardRow], snapshot_started: float):
+        """
+        Swap in rows read from the database, keeping any user updated
+        locally after the snapshot query started.
+        """
+        fresh = {row.user_id: row for row in rows}
+        for user_id, updated_at in self._updated_at.items():
+            if updated_at > snapshot_started and user_id in self._rows:
+                fresh[user_id] = self._rows[user_id]
+
+        self._rows = fresh
+        self._keys = sorted((-row.total_xp, row.user_id) for row in fresh.values())
+        self._updated_at = {
+            user_id: updated_at for user_id, updated_at in self._updated_at.items()
+            if updated_at > snapshot_started
+        }
+
+
+leaderboard = Leaderboard()
+
+
+async def reconcile_leaderboard():
+    """Reload the leaderboard from the users table"""
+    started = time.monotonic()
+
+    async with ReadSessionLocal() as db:
+        result = await db.execute(
+            select(User.id, User.username, User.total_xp, User.current_streak)
+        )
+        rows = [LeaderboardRow(*row) for row in result]
+
+    leaderboard.replace_all(rows, started)
+
+
+async def reconcile_periodically(interval: float = LEADERBOARD_RECONCILE_SECONDS):
+    """
+    Keep the leaderboard in line with the database, picking up changes
+    made by other workers or directly in the database
+    """
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await reconcile_leaderboard()
+        except Exception:
+            logger.exception("Leaderboard reconciliation failed")
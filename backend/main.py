@@ -3,40 +3,108 @@ TechLingo Backend - FastAPI Application
 A Code Vocabulary Builder API
 """
 
-from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi import FastAPI, Depends, Header, HTTPException, Query, Request, UploadFile, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import OAuth2PasswordBearer
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
-from typing import Optional, List
+from sqlalchemy import select, update, func, table, column, literal_column
+from sqlalchemy.ext.asyncio import AsyncSession
+from contextlib import asynccontextmanager
+from typing import Dict, Optional, List
+import asyncio
+import codecs
 import logging
+import re
 from datetime import datetime
-import random
 
-from database import engine, get_db, Base
+from database import (
+    DIALECT, engine, async_engine, SessionLocal, get_async_db, get_read_db, upsert
+)
 from models import User, Term, GameSession, UserProgress
 from schemas import (
-    UserCreate, UserLogin, UserResponse, TokenResponse,
-    TermResponse,
+    UserCreate, UserLogin, UserResponse, TokenResponse, EventsTokenResponse,
+    TermResponse, TermListResponse,
     GameStartRequest, GameQuestionResponse, AnswerSubmit, AnswerResult,
-    GameSessionResponse, ProgressResponse, LeaderboardEntry
+    GameRoundResponse, RoundSubmit, RoundResult,
+    GameSessionResponse, ProgressResponse, CategoryProgress, LeaderboardEntry,
+    ImportReportResponse, RejectedRow, CatalogReloadResponse
 )
 from auth import (
-    create_access_token, verify_token, get_password_hash, verify_password
+    Principal, PasswordHasherBusy, create_access_token, verify_token_cached,
+    principal_from_payload, get_password_hash_async, verify_and_update_password_async,
+    is_admin_token, create_events_token, EVENTS_TOKEN_EXPIRE_SECONDS, EVENTS_TOKEN_SCOPE
+)
+from migrations import LATEST_VERSION, schema_version
+from metrics import (
+    METRICS_ENABLED, METRICS_ALLOWED_HOSTS, MetricsMiddleware, instrument_engine, registry
 )
-from seed_data import seed_terms
+from catalog import CatalogTerm, get_catalog, load_catalog
+from decks import Deck, build_deck, deck_store
+from term_cache import term_list_cache, etag_matches, pick_encoding
+from leaderboard import leaderboard, reconcile_leaderboard, reconcile_periodically
+from importer import detect_format, import_terms
+from distractors import needs_rebuild, update_distractors
+from scheduler import (
+    MASTERY_THRESHOLD, BOX_INTERVALS, scheduler, next_box, next_box_expr, due_at_expr, now_seconds
+)
+from write_behind import WRITE_BEHIND_ENABLED, XP_PER_CORRECT_ANSWER, write_behind
+from state import shared_state
+from events import LEADERBOARD_EVENT_SIZE, event_broker, format_event, keepalive_periodically
+from fast_json import respond
+from admission import ADMISSION_ENABLED, AdmissionMiddleware
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-Base.metadata.create_all(bind=engine)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Schema and seed data are set up by migrations.py / seed_data.py, not
+    # here, so a worker only checks the version and warms its caches
+    version = await run_in_threadpool(schema_version)
+    if version < LATEST_VERSION:
+        raise RuntimeError(
+            f"Database schema is at version {version}, expected {LATEST_VERSION}: "
+            "run python migrations.py"
+        )
+
+    catalog, _ = await asyncio.gather(
+        run_in_threadpool(_reload_catalog), reconcile_leaderboard()
+    )
+    if not len(catalog):
+        logger.warning("No terms in the database: run python seed_data.py")
+
+    await shared_state.start()
+    if WRITE_BEHIND_ENABLED:
+        await write_behind.start()  # replays answers not yet applied
+
+    leaderboard_task = asyncio.create_task(reconcile_periodically())
+    keepalive_task = asyncio.create_task(keepalive_periodically(event_broker))
+    try:
+        yield
+    finally:
+        leaderboard_task.cancel()
+        keepalive_task.cancel()
+        event_broker.close_all()
+        if WRITE_BEHIND_ENABLED:
+            await write_behind.stop()
+        await shared_state.stop()
+        await async_engine.dispose()
+
 
 app = FastAPI(
     title="TechLingo API",
     description="Code Vocabulary Builder Backend",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
 )
 
+# Inside CORS, so rejected requests still carry its headers
+if ADMISSION_ENABLED:
+    app.add_middleware(AdmissionMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=[
@@ -48,49 +116,119 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+if METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+    instrument_engine(engine)
+    instrument_engine(async_engine.sync_engine)
+
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login", auto_error=False)
 
 
+@app.exception_handler(PasswordHasherBusy)
+async def password_hasher_busy_handler(request: Request, exc: PasswordHasherBusy):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Too many sign-in attempts in progress, retry shortly"},
+        headers={"Retry-After": "1"},
+    )
 
-async def get_current_user(
-    token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db)
-) -> User:
-    payload = verify_token(token)
+
+
+async def get_current_principal(token: str = Depends(oauth2_scheme)) -> Principal:
+    """Authenticate from the JWT claims alone, for routes that only need the user id"""
+    return _principal_from_token(token)
+
+
+def _principal_from_token(token: str, scope: Optional[str] = None) -> Principal:
+    payload = verify_token_cached(token)
     if payload is None:
         raise HTTPException(status_code=401, detail="Invalid token")
 
-    user_id = payload.get("sub")
-    if user_id is None:
+    principal = principal_from_payload(payload, scope)
+    if principal is None:
         raise HTTPException(status_code=401, detail="Invalid token")
 
-    user = db.query(User).filter(User.id == int(user_id)).first()
+    return principal
+
+
+async def get_current_user(
+    principal: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_async_db)
+) -> User:
+    """Load the full User row, for routes that read or mutate XP and streak"""
+    user = await db.get(User, principal.id)
     if user is None:
         raise HTTPException(status_code=401, detail="User not found")
 
     return user
 
 
+# Other workers keep their own leaderboard, schedules and catalog; changes
+# made here are applied locally and broadcast to them (no-op with one process)
+
+async def _update_leaderboard(
+    user_id: int,
+    total_xp: int,
+    current_streak: int,
+    username: Optional[str] = None
+):
+    leaderboard.update(user_id, total_xp, current_streak, username=username)
+    _push_totals(user_id)
+    await shared_state.publish("leaderboard", {
+        "user_id": user_id, "total_xp": total_xp,
+        "current_streak": current_streak, "username": username,
+    })
+
+
+async def _record_review(user_id: int, term_id: int, box: int, due_at: int):
+    scheduler.record(user_id, term_id, box, due_at)
+    await shared_state.publish("schedule", {
+        "user_id": user_id, "term_id": term_id, "box": box, "due_at": due_at,
+    })
+
+
+async def _on_catalog_changed(message: dict):
+    await run_in_threadpool(_reload_catalog)
+
+
+def _on_leaderboard_changed(message: dict):
+    leaderboard.update(
+        message["user_id"], message["total_xp"], message["current_streak"],
+        username=message["username"],
+    )
+    _push_totals(message["user_id"])
+
+
+shared_state.on("leaderboard", _on_leaderboard_changed)
+shared_state.on("schedule", lambda m: scheduler.record(
+    m["user_id"], m["term_id"], m["box"], m["due_at"]
+))
+shared_state.on("catalog", _on_catalog_changed)
+
+
 
 @app.post("/auth/register", response_model=TokenResponse)
-async def register(user_data: UserCreate, db: Session = Depends(get_db)):
-    if db.query(User).filter(User.email == user_data.email).first():
+async def register(user_data: UserCreate, db: AsyncSession = Depends(get_async_db)):
+    if await db.scalar(select(User.id).where(User.email == user_data.email)):
         raise HTTPException(status_code=400, detail="Email already registered")
 
-    if db.query(User).filter(User.username == user_data.username).first():
+    if await db.scalar(select(User.id).where(User.username == user_data.username)):
         raise HTTPException(status_code=400, detail="Username already taken")
 
     user = User(
         email=user_data.email,
         username=user_data.username,
-        hashed_password=get_password_hash(user_data.password),
+        hashed_password=await get_password_hash_async(user_data.password),
     )
     db.add(user)
-    db.commit()
-    db.refresh(user)
+    await db.commit()
+    await db.refresh(user)
+
+    await _update_leaderboard(user.id, user.total_xp, user.current_streak, username=user.username)
 
-    token = create_access_token({"sub": user.id})
+    token = create_access_token({"sub": str(user.id), "username": user.username})
 
     return TokenResponse(
         access_token=token,
@@ -103,14 +241,25 @@ async def register(user_data: UserCreate, db: Session = Depends(get_db)):
 @app.post("/auth/login", response_model=TokenResponse)
 async def login(
     form_data: OAuth2PasswordRequestForm = Depends(),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    user = db.query(User).filter(User.username == form_data.username).first()
+    user = await db.scalar(select(User).where(User.username == form_data.username))
 
-    if not user or not verify_password(form_data.password, user.hashed_password):
+    if not user:
+        raise HTTPException(status_code=401, detail="Invalid credentials")
+
+    valid, new_hash = await verify_and_update_password_async(
+        form_data.password, user.hashed_password
+    )
+    if not valid:
         raise HTTPException(status_code=401, detail="Invalid credentials")
 
-    token = create_access_token({"sub": str(user.id)})
+    if new_hash:
+        # Stored hash used outdated Argon2 parameters
+        user.hashed_password = new_hash
+        await db.commit()
+
+    token = create_access_token({"sub": str(user.id), "username": user.username})
 
     return TokenResponse(
         access_token=token,
@@ -126,28 +275,156 @@ async def get_me(current_user: User = Depends(get_current_user)):
 
 @app.get("/terms", response_model=List[TermResponse])
 async def get_terms(
+    request: Request,
     category: Optional[str] = None,
     difficulty: Optional[str] = None,
-    db: Session = Depends(get_db)
 ):
-    query = db.query(Term)
+    # Served from pre-serialized bytes; response_model only documents the shape
+    cached = term_list_cache.get(get_catalog(), category, difficulty)
+    encoding = pick_encoding(request.headers.get("accept-encoding"), len(cached.body))
+    headers = {
+        "ETag": cached.etag_for(encoding),
+        "Cache-Control": "no-cache",
+        "Vary": "Accept-Encoding",
+    }
 
-    if category:
-        query = query.filter(Term.category == category)
+    if etag_matches(request.headers.get("if-none-match"), cached.etag):
+        return Response(status_code=304, headers=headers)
+
+    body = cached.body
+    if encoding:
+        body = cached.encode(encoding)
+        headers["Content-Encoding"] = encoding
+
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+
+# Columns selectable through ?fields=
+TERM_FIELDS = {col.name: col for col in Term.__table__.columns}
 
+terms_fts = table("terms_fts", column("rowid"))
+
+# PostgreSQL searches the expression behind the ix_terms_fts GIN index; the
+# literals are inlined rather than bound so the planner can match the index
+SEARCH_CONFIG = literal_column("'english'")
+terms_document = func.to_tsvector(
+    SEARCH_CONFIG, Term.name.concat(literal_column("' '")).concat(Term.definition)
+)
+
+
+def _fts_query(q: str) -> Optional[str]:
+    """Turn free text into a safe full-text query: every word, as a prefix, must match"""
+    words = re.findall(r"\w+", q)
+    if not words:
+        return None
+    if DIALECT == "postgresql":
+        return " & ".join(f"{word}:*" for word in words)
+    return " ".join(f'"{word}"*' for word in words)
+
+
+async def _term_page(
+    db: AsyncSession,
+    category: Optional[str],
+    difficulty: Optional[str],
+    q: Optional[str],
+    fields: Optional[str],
+    limit: int,
+    cursor: Optional[int],
+) -> dict:
+    """Keyset-paginated term listing, optionally filtered by full-text search"""
+    if fields:
+        names = [name.strip() for name in fields.split(",") if name.strip()]
+        unknown = [name for name in names if name not in TERM_FIELDS]
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+        # id is always returned: it is the pagination cursor
+        names = ["id"] + [name for name in names if name != "id"]
+    else:
+        names = list(TERM_FIELDS)
+    columns = [TERM_FIELDS[name] for name in names]
+
+    filters = []
+    if category:
+        filters.append(Term.category == category)
     if difficulty:
-        query = query.filter(Term.difficulty == difficulty)
+        filters.append(Term.difficulty == difficulty)
+
+    if q is not None:
+        match = _fts_query(q)
+        if match is None:
+            return {"terms": [], "total": 0, "next_cursor": None}
+
+        if DIALECT == "postgresql":
+            order_key = Term.id
+            query = select(*columns).where(
+                terms_document.op("@@")(func.to_tsquery(SEARCH_CONFIG, match)), *filters
+            )
+        else:
+            order_key = terms_fts.c.rowid
+            query = (
+                select(*columns)
+                .select_from(terms_fts)
+                .join(Term, Term.id == terms_fts.c.rowid)
+                .where(literal_column("terms_fts").op("MATCH")(match), *filters)
+            )
+    else:
+        order_key = Term.id
+        query = select(*columns).where(*filters)
+
+    page_query = query
+    if cursor is not None:
+        page_query = page_query.where(order_key > cursor)
+
+    rows = (await db.execute(page_query.order_by(order_key).limit(limit + 1))).all()
+    next_cursor = rows[limit - 1].id if len(rows) > limit else None
+
+    if q is None:
+        total = len(get_catalog().pool(category, difficulty))
+    else:
+        total = await db.scalar(
+            select(func.count()).select_from(query.with_only_columns(Term.id).subquery())
+        )
+
+    return {
+        "terms": [dict(row._mapping) for row in rows[:limit]],
+        "total": total,
+        "next_cursor": next_cursor,
+    }
 
-    terms = query.all()
-    return [TermResponse.model_validate(t) for t in terms]
+
+@app.get("/terms/page", response_model=TermListResponse)
+async def get_term_page(
+    category: Optional[str] = None,
+    difficulty: Optional[str] = None,
+    q: Optional[str] = None,
+    fields: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[int] = None,
+    db: AsyncSession = Depends(get_read_db)
+):
+    return respond(await _term_page(db, category, difficulty, q, fields, limit, cursor))
+
+
+@app.get("/terms/search", response_model=TermListResponse)
+async def search_terms(
+    q: str = Query(..., min_length=1),
+    category: Optional[str] = None,
+    difficulty: Optional[str] = None,
+    fields: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[int] = None,
+    db: AsyncSession = Depends(get_read_db)
+):
+    return respond(await _term_page(db, category, difficulty, q, fields, limit, cursor))
 
 
 
 @app.post("/game/start", response_model=GameSessionResponse)
 async def start_game(
     request: GameStartRequest,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_async_db)
 ):
     session = GameSession(
         user_id=current_user.id,
@@ -156,22 +433,42 @@ async def start_game(
         total_questions=5,
     )
 
+    schedule = await scheduler.get(db, current_user.id)
+
     db.add(session)
-    db.commit()
-    db.refresh(session)
+    await db.flush()  # assigns session.id, which seeds the deck
+
+    try:
+        deck = build_deck(
+            get_catalog(), session.id, current_user.id,
+            request.category, request.difficulty, session.total_questions,
+            schedule=schedule,
+        )
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Not enough terms")
+
+    session.total_questions = len(deck.questions)
+    session.deck_term_ids = ",".join(str(q.term_id) for q in deck.questions)
+
+    await db.commit()
+    await db.refresh(session)
+
+    await deck_store.put(session.id, deck)
 
     return GameSessionResponse.model_validate(session)
 
-@app.get("/game/{session_id}/question", response_model=GameQuestionResponse)
-async def get_question(
-    session_id: int,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
-):
-    session = db.query(GameSession).filter(
+async def _load_deck(db: AsyncSession, session_id: int, user_id: int) -> Deck:
+    deck = await deck_store.get(session_id)
+    if deck is not None and deck.user_id == user_id:
+        return deck
+
+    if WRITE_BEHIND_ENABLED and write_behind.has_pending(user_id):
+        await write_behind.flush()  # brings the answered count up to date
+
+    session = await db.scalar(select(GameSession).where(
         GameSession.id == session_id,
-        GameSession.user_id == current_user.id
-    ).first()
+        GameSession.user_id == user_id
+    ))
 
     if session is None:
         raise HTTPException(status_code=404, detail="Game session not found")
@@ -180,195 +477,674 @@ async def get_question(
     if completed:
         raise HTTPException(status_code=400, detail="Game already completed")
 
-    query = db.query(Term)
+    # Deck expired from the shared state: rebuild it from the terms drawn
+    # at the start and resume after the questions already answered. Sessions
+    # started before the terms were stored are redrawn from the seed.
+    try:
+        if session.deck_term_ids:
+            deck = build_deck(
+                get_catalog(), session.id, session.user_id,
+                session.category, session.difficulty, session.total_questions,
+                term_ids=[int(term_id) for term_id in session.deck_term_ids.split(",")],
+            )
+        else:
+            deck = build_deck(
+                get_catalog(), session.id, session.user_id,
+                session.category, session.difficulty, session.total_questions,
+                schedule=await scheduler.get(db, session.user_id),
+            )
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Not enough terms")
 
-    category = session.category
-    difficulty = session.difficulty
+    deck.position = min(session.answered, len(deck.questions))
+    return deck
 
-    if category:
-        query = query.filter(Term.category == category)
-    if difficulty:
-        query = query.filter(Term.difficulty == difficulty)
 
-    terms = query.all()
-    if len(terms) < 4:
-        raise HTTPException(status_code=400, detail="Not enough terms")
+def _question_response(number: int, term: CatalogTerm, options) -> dict:
+    """A GameQuestionResponse as a plain dict"""
+    return {
+        "id": number,
+        "term_id": term.id,
+        "definition": term.definition,
+        "code_example": term.code_example,
+        "real_world_example": term.real_world_example,
+        "options": list(options),
+        "correct_answer": term.name,
+        "category": term.category,
+        "difficulty": term.difficulty,
+    }
+
+
+@app.get("/game/{session_id}/question", response_model=GameQuestionResponse)
+async def get_question(
+    session_id: int,
+    current_user: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_async_db)
+):
+    deck = await _load_deck(db, session_id, current_user.id)
+    catalog = get_catalog()
+
+    # Skip questions whose term has been removed from the catalog since the draw
+    correct_term = None
+    while correct_term is None and deck.position < len(deck.questions):
+        question = deck.questions[deck.position]
+        deck.position += 1
+        correct_term = catalog.get(question.term_id)
+
+    await deck_store.put(session_id, deck)  # keeps the position for other workers
+
+    if correct_term is None:
+        raise HTTPException(status_code=400, detail="No questions left")
+
+    return respond(_question_response(deck.position, correct_term, question.options))
+
+
+@app.get("/game/{session_id}/round", response_model=GameRoundResponse)
+async def get_round(
+    session_id: int,
+    current_user: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Every remaining question of the session at once, for POST /game/{id}/round"""
+    deck = await _load_deck(db, session_id, current_user.id)
+    catalog = get_catalog()
+
+    questions = []
+    for number, question in enumerate(deck.questions[deck.position:], start=deck.position + 1):
+        term = catalog.get(question.term_id)
+        if term is not None:
+            questions.append(_question_response(number, term, question.options))
+
+    deck.position = len(deck.questions)
+    await deck_store.put(session_id, deck)
+
+    if not questions:
+        raise HTTPException(status_code=400, detail="No questions left")
+
+    return respond({"session_id": session_id, "questions": questions})
+
+def _progress_upsert(user_id: int, term_id: int, is_correct: bool, now: int):
+    """Count one answer in UserProgress, returning the new Leitner box and due time"""
+    # The new box and due time are derived from the stored box in SQL
+    box_expr = next_box_expr(is_correct)
+    progress_update = {
+        "times_seen": UserProgress.times_seen + 1,
+        "last_seen_at": func.now(),
+        "box": box_expr,
+        "due_at": due_at_expr(box_expr, now),
+    }
+    if is_correct:
+        progress_update["times_correct"] = UserProgress.times_correct + 1
+        progress_update["mastered"] = UserProgress.times_correct + 1 >= MASTERY_THRESHOLD
+
+    correct_inc = 1 if is_correct else 0
+    first_box = 1 if is_correct else 0
+    return (
+        upsert(UserProgress)
+        .values(
+            user_id=user_id,
+            term_id=term_id,
+            times_seen=1,
+            times_correct=correct_inc,
+            mastered=correct_inc >= MASTERY_THRESHOLD,
+            box=first_box,
+            due_at=due_at_expr(first_box, now),
+        )
+        .on_conflict_do_update(
+            index_elements=[UserProgress.user_id, UserProgress.term_id],
+            set_=progress_update,
+        )
+        .returning(UserProgress.box, UserProgress.due_at)
+    )
+
 
-    correct_term = random.choice(terms)
-    correct_id = correct_term.id
-
-    wrong_terms = [t for t in terms if t.id != correct_id]
-    random.shuffle(wrong_terms)
-
-    options = [t.name for t in wrong_terms[:3]] + [correct_term.name]
-    random.shuffle(options)
-
-    return GameQuestionResponse(
-        id=int(session.correct_answers + session.total_questions),
-        term_id=int(correct_id),
-        definition=str(correct_term.definition),
-        code_example=correct_term.code_example,
-        real_world_example=str(correct_term.real_world_example),
-        options=list(options),
-        correct_answer=str(correct_term.name),
-        category=str(correct_term.category),
-        difficulty=str(correct_term.difficulty),
+def _progress_by_term(user_id: int):
+    """The user's progress counters, one row per term seen"""
+    return (
+        select(UserProgress.term_id, UserProgress.mastered, UserProgress.times_correct, UserProgress.times_seen)
+        .where(UserProgress.user_id == user_id)
     )
 
+
+def _recent_progress(user_id: int, limit: int = 5):
+    """Ids of the terms the user answered last"""
+    return (
+        select(UserProgress.term_id)
+        .where(UserProgress.user_id == user_id)
+        .order_by(UserProgress.last_seen_at.desc())
+        .limit(limit)
+    )
+
+
+async def _record_answer_deferred(
+    db: AsyncSession,
+    current_user: Principal,
+    session_id: int,
+    term_id: int,
+    is_correct: bool
+):
+    """Write-behind path: log the outcome and update in-memory state only"""
+    deck = await deck_store.get(session_id)
+    if deck is None or deck.user_id != current_user.id:
+        owned = await db.scalar(select(GameSession.id).where(
+            GameSession.id == session_id,
+            GameSession.user_id == current_user.id
+        ))
+        if owned is None:
+            raise HTTPException(status_code=404, detail="Game session not found")
+
+    schedule = await scheduler.get(db, current_user.id)
+    now = now_seconds()
+    await write_behind.record(current_user.id, session_id, term_id, is_correct, now)
+
+    # Same rules the flush applies in SQL
+    box = next_box(schedule.box.get(term_id, 0), is_correct)
+    await _record_review(current_user.id, term_id, box, now + BOX_INTERVALS[box])
+
+    row = leaderboard.get(current_user.id)
+    if row is not None:
+        await _update_leaderboard(
+            current_user.id,
+            row.total_xp + (XP_PER_CORRECT_ANSWER if is_correct else 0),
+            row.current_streak + 1 if is_correct else 0,
+        )
+
+
 @app.post("/game/{session_id}/answer", response_model=AnswerResult)
 async def submit_answer(
     session_id: int,
     answer: AnswerSubmit,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    session = db.query(GameSession).filter(
-        GameSession.id == session_id,
-        GameSession.user_id == current_user.id
-    ).first()
-
-    if session is None:
-        raise HTTPException(status_code=404, detail="Game session not found")
-
-    term = db.query(Term).filter(Term.id == int(answer.term_id)).first()
+    term = get_catalog().get(int(answer.term_id))
     if term is None:
         raise HTTPException(status_code=404, detail="Term not found")
 
     is_correct = answer.answer == term.name
-    xp_earned = 0
-
-    
-    progress = db.query(UserProgress).filter(
-        UserProgress.user_id == current_user.id,
-        UserProgress.term_id == term.id
-    ).first()
-
-    if not progress:
-        progress = UserProgress(
-            user_id=current_user.id,
-            term_id=term.id,
-            times_seen=0,
-            times_correct=0,
+    xp_earned = XP_PER_CORRECT_ANSWER if is_correct else 0
+    correct_inc = 1 if is_correct else 0
+
+    result = AnswerResult(
+        correct=is_correct,
+        correct_answer=term.name,
+        xp_earned=xp_earned,
+        explanation=term.real_world_example,
+    )
+
+    if WRITE_BEHIND_ENABLED:
+        await _record_answer_deferred(db, current_user, session_id, term.id, is_correct)
+        return result
+
+    # Every counter is incremented in SQL, so concurrent answers from the
+    # same user cannot overwrite each other
+    session_id = await db.scalar(
+        update(GameSession)
+        .where(
+            GameSession.id == session_id,
+            GameSession.user_id == current_user.id
+        )
+        .values(
+            answered=GameSession.answered + 1,
+            correct_answers=GameSession.correct_answers + correct_inc,
         )
-        db.add(progress)
+        .returning(GameSession.id)
+    )
 
-    progress.times_seen += 1
+    if session_id is None:
+        raise HTTPException(status_code=404, detail="Game session not found")
+
+    review = (await db.execute(
+        _progress_upsert(current_user.id, term.id, is_correct, now_seconds())
+    )).first()
 
     if is_correct:
-        progress.times_correct += 1
-        session.correct_answers += 1
-        xp_earned = 10
-        current_user.total_xp += xp_earned
-        current_user.current_streak += 1
-
-        if progress.times_correct >= 3:
-            progress.mastered = True
+        user_update = {
+            "total_xp": User.total_xp + xp_earned,
+            "current_streak": User.current_streak + 1,
+        }
     else:
-        current_user.current_streak = 0
+        user_update = {"current_streak": 0}
 
-    db.commit()
-    db.refresh(progress)
-    db.refresh(current_user)
-    db.refresh(session)
+    totals = (await db.execute(
+        update(User)
+        .where(User.id == current_user.id)
+        .values(**user_update)
+        .returning(User.total_xp, User.current_streak)
+    )).first()
 
+    await db.commit()
+
+    await _record_review(current_user.id, term.id, *review)
+    if totals is not None:
+        await _update_leaderboard(current_user.id, *totals, username=current_user.username)
+
+    return result
+
+def _session_xp(correct: int, total: int):
+    """End-of-game accuracy bonus, and the session's XP including it"""
+    accuracy = (correct / total) if total > 0 else 0.0
+    bonus_xp = int(accuracy * 20)
+    return bonus_xp, (correct * 10) + bonus_xp
 
-    return AnswerResult(
-        correct=is_correct,
-        correct_answer=term.name,
-        xp_earned=xp_earned,
-        explanation=term.real_world_example,
-    )
 
 @app.post("/game/{session_id}/end", response_model=GameSessionResponse)
 async def end_game(
     session_id: int,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    session = db.query(GameSession).filter(
+    if WRITE_BEHIND_ENABLED and write_behind.has_pending(current_user.id):
+        await write_behind.flush()
+
+    session = await db.scalar(select(GameSession).where(
         GameSession.id == session_id,
         GameSession.user_id == current_user.id
-    ).first()
+    ))
 
     if session is None:
         raise HTTPException(status_code=404, detail="Game session not found")
 
     session.completed = True
     session.completed_at = datetime.utcnow()
+    await deck_store.discard(session.id)
 
-    correct = int(session.correct_answers)
-    total = int(session.total_questions)
+    bonus_xp, session.xp_earned = _session_xp(int(session.correct_answers), int(session.total_questions))
+    totals = (await db.execute(
+        update(User)
+        .where(User.id == current_user.id)
+        .values(total_xp=User.total_xp + bonus_xp)
+        .returning(User.total_xp, User.current_streak)
+    )).first()
 
-    accuracy = (correct / total) if total > 0 else 0.0
-    bonus_xp = int(accuracy * 20)
+    await db.commit()
+    await db.refresh(session)
 
-    session.xp_earned = (correct * 10) + bonus_xp
-    current_user.total_xp = int(current_user.total_xp) + bonus_xp
-
-    db.commit()
-    db.refresh(session)
+    if totals is not None:
+        await _update_leaderboard(current_user.id, *totals, username=current_user.username)
 
     return GameSessionResponse.model_validate(session)
 
 
-
-@app.get("/progress", response_model=ProgressResponse)
-async def get_progress(
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+@app.post("/game/{session_id}/round", response_model=RoundResult)
+async def submit_round(
+    session_id: int,
+    submission: RoundSubmit,
+    current_user: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    total_terms = db.query(Term).count()
+    """
+    Score a batch of answers and end the session in one transaction, with
+    the same progress, XP and streak updates as /answer for each, then /end
+    """
+    if any(answer.session_id not in (None, session_id) for answer in submission.answers):
+        raise HTTPException(status_code=400, detail="Answer for another session")
+
+    catalog = get_catalog()
+    terms = [catalog.get(int(answer.term_id)) for answer in submission.answers]
+    if None in terms:
+        raise HTTPException(status_code=404, detail="Term not found")
 
-    progress_rows = db.query(UserProgress).filter(
-        UserProgress.user_id == current_user.id
-    ).all()
+    if WRITE_BEHIND_ENABLED and write_behind.has_pending(current_user.id):
+        await write_behind.flush()
 
-    terms_learned = sum(1 for p in progress_rows if p.mastered)
+    current = (await db.execute(
+        select(GameSession.completed, GameSession.answered, GameSession.deck_term_ids).where(
+            GameSession.id == session_id,
+            GameSession.user_id == current_user.id
+        )
+    )).first()
+    if current is None:
+        raise HTTPException(status_code=404, detail="Game session not found")
+    if current.completed:
+        raise HTTPException(status_code=400, detail="Game already completed")
 
-    accuracy = (
-        sum(p.times_correct for p in progress_rows) /
-        max(sum(p.times_seen for p in progress_rows), 1)
-    ) * 100
+    # Only the drawn terms not yet answered through /answer, each once
+    if current.deck_term_ids:
+        drawn = [int(term_id) for term_id in current.deck_term_ids.split(",")]
+    else:
+        deck = await _load_deck(db, session_id, current_user.id)
+        drawn = [question.term_id for question in deck.questions]
+    term_ids = [term.id for term in terms]
+    if len(set(term_ids)) != len(term_ids):
+        raise HTTPException(status_code=400, detail="Duplicate answers")
+    if not set(term_ids) <= set(drawn[current.answered:]):
+        raise HTTPException(status_code=400, detail="Term not in this round")
+
+    outcomes = [answer.answer == term.name for answer, term in zip(submission.answers, terms)]
+    correct = sum(outcomes)
+
+    # Completing the session in the same statement means a round can only
+    # be scored once, even if the request is retried; it is not scored at
+    # all when an answer came in since the check above
+    session = await db.scalar(
+        update(GameSession)
+        .where(
+            GameSession.id == session_id,
+            GameSession.user_id == current_user.id,
+            GameSession.completed.is_(False),
+            GameSession.answered == current.answered
+        )
+        .values(
+            answered=GameSession.answered + len(outcomes),
+            correct_answers=GameSession.correct_answers + correct,
+            completed=True,
+            completed_at=datetime.utcnow(),
+        )
+        .returning(GameSession)
+    )
 
-    categories_completed = []
+    if session is None:
+        raise HTTPException(status_code=409, detail="Game session changed, reload the round")
+
+    bonus_xp, session.xp_earned = _session_xp(int(session.correct_answers), int(session.total_questions))
+
+    now = now_seconds()
+    reviews = []
+    for term, is_correct in zip(terms, outcomes):
+        review = (await db.execute(
+            _progress_upsert(current_user.id, term.id, is_correct, now)
+        )).first()
+        reviews.append((term.id, *review))
+
+    # The streak ends up as if the answers came one at a time: it carries on
+    # when all are right, otherwise it counts from the last wrong answer
+    if all(outcomes):
+        streak = User.current_streak + len(outcomes)
+    else:
+        streak = outcomes[::-1].index(False)
+
+    totals = (await db.execute(
+        update(User)
+        .where(User.id == current_user.id)
+        .values(
+            total_xp=User.total_xp + correct * XP_PER_CORRECT_ANSWER + bonus_xp,
+            current_streak=streak,
+        )
+        .returning(User.total_xp, User.current_streak)
+    )).first()
+
+    await db.commit()
+    await db.refresh(session)
+
+    await deck_store.discard(session_id)
+    for review in reviews:
+        await _record_review(current_user.id, *review)
+    if totals is not None:
+        await _update_leaderboard(current_user.id, *totals, username=current_user.username)
+
+    return RoundResult(
+        results=[
+            AnswerResult(
+                correct=is_correct,
+                correct_answer=term.name,
+                xp_earned=XP_PER_CORRECT_ANSWER if is_correct else 0,
+                explanation=term.real_world_example,
+            )
+            for term, is_correct in zip(terms, outcomes)
+        ],
+        session=GameSessionResponse.model_validate(session),
+    )
+
+
+
+@app.get("/progress", response_model=ProgressResponse)
+async def get_progress(
+    current_user: Principal = Depends(get_current_principal),
+    # With READ_REPLICA_URL set, the last answers may show up only after
+    # the replica catches up
+    db: AsyncSession = Depends(get_read_db)
+):
+    if WRITE_BEHIND_ENABLED and write_behind.has_pending(current_user.id):
+        await write_behind.flush()
+
+    catalog = get_catalog()
+
+    # One indexed pass over the user's progress rows, summed per category
+    # through the catalog: grouping by Term.category in SQL sorts through a
+    # temp b-tree, and term totals per category come from the catalog anyway
+    mastered_by_category: Dict[str, int] = {}
+    times_correct = times_seen = 0
+    for term_id, mastered, correct, seen in (await db.execute(_progress_by_term(current_user.id))).all():
+        term = catalog.get(term_id)
+        if term is None:
+            continue
+        mastered_by_category[term.category] = mastered_by_category.get(term.category, 0) + int(mastered)
+        times_correct += correct
+        times_seen += seen
+    terms_learned = sum(mastered_by_category.values())
+
+    accuracy = (times_correct / max(times_seen, 1)) * 100
+
+    categories = [
+        CategoryProgress(
+            category=category,
+            terms_mastered=mastered_by_category.get(category, 0),
+            total_terms=len(catalog.pool(category)),
+        )
+        for category in catalog.categories
+    ]
+    categories_completed = [
+        c.category for c in categories if c.terms_mastered >= c.total_terms
+    ]
+
+    recent_ids = (await db.scalars(_recent_progress(current_user.id))).all()
+    recent_terms = [
+        TermResponse.model_validate(catalog.get(term_id))
+        for term_id in recent_ids
+        if catalog.get(term_id) is not None
+    ]
 
     return ProgressResponse(
         user_id=current_user.id,
         terms_learned=terms_learned,
-        total_terms=total_terms,
+        total_terms=len(catalog),
         accuracy_rate=round(accuracy, 1),
         categories_completed=categories_completed,
-        recent_terms=[],
+        recent_terms=recent_terms,
+        categories=categories,
     )
 
 
-@app.get("/progress/leaderboard", response_model=List[LeaderboardEntry])
-async def get_leaderboard(
-    limit: int = 10,
-    db: Session = Depends(get_db)
-):
-    users = db.query(User).order_by(User.total_xp.desc()).limit(limit).all()
+# Leaderboard entries are built as plain dicts in the LeaderboardEntry shape,
+# shared by the routes and the /events stream
 
+def _top_entries(limit: int) -> List[dict]:
     return [
-        LeaderboardEntry(
-            rank=i + 1,
-            username=str(user.username),
-            total_xp=int(user.total_xp),
-            current_streak=int(user.current_streak),
-        )
-        for i, user in enumerate(users)
+        {
+            "rank": rank,
+            "username": row.username,
+            "total_xp": row.total_xp,
+            "current_streak": row.current_streak,
+        }
+        for rank, row in leaderboard.top(limit)
     ]
 
 
-@app.on_event("startup")
-async def startup_event():
-    db = next(get_db())
+def _my_entry(user_id: int) -> Optional[dict]:
+    row = leaderboard.get(user_id)
+    if row is None:
+        return None
+
+    return {
+        "rank": leaderboard.rank(user_id),
+        "username": row.username,
+        "total_xp": row.total_xp,
+        "current_streak": row.current_streak,
+    }
+
+
+@app.get("/progress/leaderboard", response_model=List[LeaderboardEntry])
+async def get_leaderboard(limit: int = 10):
+    return respond(_top_entries(limit))
+
+
+@app.get("/progress/leaderboard/me", response_model=LeaderboardEntry)
+async def get_my_rank(current_user: Principal = Depends(get_current_principal)):
+    entry = _my_entry(current_user.id)
+    if entry is None:
+        raise HTTPException(status_code=404, detail="Not on the leaderboard yet")
+
+    return respond(entry)
+
+
+def _push_totals(user_id: int):
+    """Stream a user's new totals to their connections, and the top list when it moved"""
+    if not event_broker.has_subscribers():
+        return
+
+    if event_broker.has_subscribers(user_id):
+        entry = _my_entry(user_id)
+        if entry is not None:
+            event_broker.publish("me", entry, user_id=user_id)
+
+    event_broker.publish_changed("leaderboard", _top_entries(LEADERBOARD_EVENT_SIZE))
+
+
+@app.post("/events/token", response_model=EventsTokenResponse)
+async def get_events_token(current_user: Principal = Depends(get_current_principal)):
+    """
+    Short-lived token for GET /events?token=..., so the access token never
+    appears in a URL (EventSource cannot send headers)
+    """
+    return EventsTokenResponse(
+        token=create_events_token(current_user), expires_in=EVENTS_TOKEN_EXPIRE_SECONDS
+    )
+
+
+@app.get("/events")
+async def stream_events(
+    token: Optional[str] = Query(None, description="Token from POST /events/token"),
+    header_token: Optional[str] = Depends(optional_oauth2_scheme),
+):
+    """
+    Server-Sent Events: `me` (own XP, streak and rank) and `leaderboard`
+    (top entries) on connect, then whenever answers or game ends change them
+    """
+    if header_token:
+        principal = _principal_from_token(header_token)
+    elif token:
+        principal = _principal_from_token(token, scope=EVENTS_TOKEN_SCOPE)
+    else:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+
+    subscription = event_broker.subscribe(principal.id)
+    # Start from a snapshot, so clients never need to poll
+    subscription.queue.put_nowait(b"retry: 3000\n\n")
+    entry = _my_entry(principal.id)
+    if entry is not None:
+        subscription.queue.put_nowait(format_event("me", entry))
+    subscription.queue.put_nowait(format_event("leaderboard", _top_entries(LEADERBOARD_EVENT_SIZE)))
+
+    return StreamingResponse(
+        event_broker.stream(subscription),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def require_admin(x_admin_token: Optional[str] = Header(None)):
+    if not is_admin_token(x_admin_token):
+        raise HTTPException(status_code=403, detail="Admin token required")
+
+
+def _reload_catalog():
+    db = SessionLocal()
     try:
-        if db.query(Term).count() == 0:
-            seed_terms(db)
+        return load_catalog(db)
     finally:
         db.close()
 
+
+# One refresh at a time; references keep the running tasks alive
+_distractor_lock = asyncio.Lock()
+_distractor_tasks = set()
+
+
+async def _refresh_distractors(changed_ids: List[int]):
+    """Update the distractor index for imported terms, then reload the catalog"""
+    try:
+        async with _distractor_lock:
+            updated = await run_in_threadpool(update_distractors, changed_ids)
+            await run_in_threadpool(_reload_catalog)
+            await shared_state.publish("catalog", {})
+        logger.info("Distractor lists updated for %d terms", updated)
+    except Exception:
+        logger.exception("Distractor refresh after import failed")
+
+
+@app.post(
+    "/admin/terms/import",
+    response_model=ImportReportResponse,
+    dependencies=[Depends(require_admin)],
+)
+async def import_terms_file(
+    file: UploadFile,
+    format: Optional[str] = Query(None, pattern="^(jsonl|csv)$"),
+):
+    # The upload is spooled to disk by Starlette and decoded line by line,
+    # so memory use is bounded by the import chunk size
+    lines = codecs.iterdecode(file.file, "utf-8")
+    try:
+        report = await run_in_threadpool(
+            import_terms, lines, format or detect_format(file.filename),
+            refresh_distractors=False,
+        )
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail="File is not valid UTF-8")
+
+    distractors = "unchanged"
+    if report.written:
+        catalog = await run_in_threadpool(_reload_catalog)
+        await shared_state.publish("catalog", {})
+
+        # Scoring the changed terms takes seconds on a large catalog, so it
+        # runs after the response; a full rebuild is left to distractors.py
+        if needs_rebuild(len(report.changed_ids), len(catalog)):
+            distractors = "rebuild_needed"
+        else:
+            distractors = "updating"
+            task = asyncio.create_task(_refresh_distractors(report.changed_ids))
+            _distractor_tasks.add(task)
+            task.add_done_callback(_distractor_tasks.discard)
+
+    return ImportReportResponse(
+        rows_read=report.rows_read,
+        written=report.written,
+        unchanged=report.unchanged,
+        rejected_count=report.rejected_count,
+        rejected=[RejectedRow(line=line, reason=reason) for line, reason in report.rejected],
+        distractors=distractors,
+        elapsed_seconds=round(report.elapsed_seconds, 3),
+        rows_per_second=round(report.rows_per_second, 1),
+    )
+
+
+@app.post(
+    "/admin/catalog/reload",
+    response_model=CatalogReloadResponse,
+    dependencies=[Depends(require_admin)],
+)
+async def reload_catalog():
+    """Pick up terms changed outside this process (e.g. by importer.py)"""
+    catalog = await run_in_threadpool(_reload_catalog)
+    await shared_state.publish("catalog", {})
+    return CatalogReloadResponse(terms=len(catalog), version=catalog.version)
+
+
 @app.get("/health")
 async def health():
     return {"status": "ok"}
+
+
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics(request: Request):
+    # Only served locally, and only when metrics are enabled
+    if not METRICS_ENABLED or request.client is None \
+            or request.client.host not in METRICS_ALLOWED_HOSTS:
+        raise HTTPException(status_code=404, detail="Not Found")
+
+    return PlainTextResponse(
+        registry.render(),
+        media_type="text/plain; version=0.0.4",
+    )
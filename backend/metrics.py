@@ -0,0 +1,330 @@
+"""
+Opt-in request metrics exposed in Prometheus text format
+
+Enable with TECHLINGO_METRICS=1. Records per-route latency histograms,
+SQL query counts and time per request, and timings for password hashing
+and JWT handling. Set METRICS_PROFILE_SLOW_MS to also sample the event
+loop's stack while requests run and dump folded stacks (flamegraph.pl /
+speedscope input) for requests slower than that threshold.
+"""
+
+import contextvars
+import os
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import event
+
+METRICS_ENABLED = os.getenv("TECHLINGO_METRICS", "0") == "1"
+METRICS_ALLOWED_HOSTS = set(
+    os.getenv("METRICS_ALLOWED_HOSTS", "127.0.0.1,::1,localhost").split(",")
+)
+METRICS_PROFILE_SLOW_MS = float(os.getenv("METRICS_PROFILE_SLOW_MS", "0"))
+METRICS_PROFILE_INTERVAL_MS = float(os.getenv("METRICS_PROFILE_INTERVAL_MS", "5"))
+METRICS_PROFILE_DIR = os.getenv("METRICS_PROFILE_DIR", "./profiles")
+
+# Seconds; spans sub-millisecond cache hits up to multi-second Argon2 stalls
+DEFAULT_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+
+# =========================
+# PRIMITIVES
+# =========================
+
+class Histogram:
+    """Cumulative-bucket histogram; observe() is safe from any thread"""
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.total += value
+            self.count += 1
+
+
+class Registry:
+    def __init__(self):
+        self.histograms: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], Histogram] = {}
+        self.counters: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], float] = {}
+        self.gauges: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], Callable[[], float]] = {}
+        self.help: Dict[str, Tuple[str, str]] = {}
+        self._lock = threading.Lock()
+
+    def describe(self, name: str, kind: str, text: str):
+        self.help[name] = (kind, text)
+
+    def histogram(self, name: str, **labels: str) -> Histogram:
+        key = (name, tuple(sorted(labels.items())))
+        hist = self.histograms.get(key)
+        if hist is None:
+            with self._lock:
+                hist = self.histograms.setdefault(key, Histogram())
+        return hist
+
+    def inc(self, name: str, value: float = 1, **labels: str):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def gauge(self, name: str, read: Callable[[], float], **labels: str):
+        """Report `read()` at render time"""
+        self.gauges[(name, tuple(sorted(labels.items())))] = read
+
+    def render(self) -> str:
+        """Serialize every metric in the Prometheus text exposition format"""
+        lines: List[str] = []
+        described = set()
+
+        def header(name):
+            if name not in described and name in self.help:
+                kind, text = self.help[name]
+                lines.append(f"# HELP {name} {text}")
+                lines.append(f"# TYPE {name} {kind}")
+                described.add(name)
+
+        for (name, labels), value in sorted(self.counters.items()):
+            header(name)
+            lines.append(f"{name}{_labels(labels)} {value}")
+
+        for (name, labels), read in sorted(self.gauges.items(), key=lambda kv: kv[0]):
+            header(name)
+            lines.append(f"{name}{_labels(labels)} {read()}")
+
+        for (name, labels), hist in sorted(self.histograms.items(), key=lambda kv: kv[0]):
+            header(name)
+            with hist._lock:
+                counts, total, count = list(hist.counts), hist.total, hist.count
+            cumulative = 0
+            for bound, bucket_count in zip(hist.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f"{name}_bucket{_labels(labels + (('le', repr(bound)),))} {cumulative}")
+            lines.append(f"{name}_bucket{_labels(labels + (('le', '+Inf'),))} {count}")
+            lines.append(f"{name}_sum{_labels(labels)} {total}")
+            lines.append(f"{name}_count{_labels(labels)} {count}")
+
+        return "\n".join(lines) + "\n"
+
+
+def _labels(labels: Tuple[Tuple[str, str], ...]) -> str:
+    if not labels:
+        return ""
+    escaped = (
+        f'{k}="{str(v).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+        for k, v in labels
+    )
+    return "{" + ",".join(escaped) + "}"
+
+
+registry = Registry()
+registry.describe("techlingo_http_request_seconds", "histogram", "Request latency by route")
+registry.describe("techlingo_http_requests_total", "counter", "Requests by route and status")
+registry.describe("techlingo_db_queries_total", "counter", "SQL statements executed, by route")
+registry.describe("techlingo_db_seconds_total", "counter", "Time spent in SQL statements, by route")
+registry.describe("techlingo_operation_seconds", "histogram", "Timed auth operations")
+registry.describe("techlingo_slow_requests_profiled_total", "counter", "Slow requests with a stack dump")
+
+
+# =========================
+# PER-REQUEST STATE
+# =========================
+
+class RequestStats:
+    __slots__ = ("queries", "db_seconds", "samples")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.samples: Optional[Counter] = None
+
+
+_current_request: contextvars.ContextVar[Optional[RequestStats]] = contextvars.ContextVar(
+    "techlingo_request_stats", default=None
+)
+
+
+@contextmanager
+def timed(operation: str):
+    """Time a block into techlingo_operation_seconds{operation=...}"""
+    if not METRICS_ENABLED:
+        yield
+        return
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        registry.histogram(
+            "techlingo_operation_seconds", operation=operation
+        ).observe(time.perf_counter() - start)
+
+
+# =========================
+# SQLALCHEMY HOOKS
+# =========================
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_start"].pop()
+    stats = _current_request.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.db_seconds += elapsed
+
+
+def instrument_engine(sync_engine):
+    """Count queries and DB time on an Engine (use async_engine.sync_engine for async)"""
+    event.listen(sync_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(sync_engine, "after_cursor_execute", _after_cursor_execute)
+
+
+# =========================
+# SAMPLING PROFILER
+# =========================
+
+class StackSampler:
+    """
+    Daemon thread sampling one thread's stack while requests are in flight.
+    Each sample is credited to every in-flight request as a folded stack.
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.thread_id: Optional[int] = None
+        self.active: Dict[int, RequestStats] = {}
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self, thread_id: int):
+        self.thread_id = thread_id
+        if self._thread is None:
+            self._thread = threading.Thread(
+                target=self._run, name="metrics-sampler", daemon=True
+            )
+            self._thread.start()
+
+    def track(self, stats: RequestStats):
+        stats.samples = Counter()
+        with self._lock:
+            self.active[id(stats)] = stats
+
+    def untrack(self, stats: RequestStats):
+        with self._lock:
+            self.active.pop(id(stats), None)
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                if not self.active:
+                    continue
+                targets = list(self.active.values())
+
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            folded = ";".join(reversed(stack))
+
+            for stats in targets:
+                stats.samples[folded] += 1
+
+
+_sampler = StackSampler(METRICS_PROFILE_INTERVAL_MS / 1000)
+
+
+def _dump_profile(route: str, elapsed: float, samples: Counter):
+    os.makedirs(METRICS_PROFILE_DIR, exist_ok=True)
+    safe_route = "".join(c if c.isalnum() else "_" for c in route).strip("_")
+    path = os.path.join(
+        METRICS_PROFILE_DIR,
+        f"{time.strftime('%Y%m%d-%H%M%S')}-{safe_route}-{int(elapsed * 1000)}ms.folded",
+    )
+    with open(path, "w") as f:
+        for stack, count in samples.most_common():
+            f.write(f"{stack} {count}\n")
+
+
+# =========================
+# MIDDLEWARE
+# =========================
+
+# Streams stay open for minutes: their lifetime is not a latency, and the
+# profiler would sample every idle one
+EXEMPT_PATHS = {"/events"}
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware recording latency, status and DB usage per route"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in EXEMPT_PATHS:
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = _current_request.set(stats)
+        status = {"code": 500}
+
+        profiling = METRICS_PROFILE_SLOW_MS > 0
+        if profiling:
+            _sampler.start(threading.get_ident())
+            _sampler.track(stats)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            _current_request.reset(token)
+            if profiling:
+                _sampler.untrack(stats)
+
+            route = scope.get("route")
+            path = getattr(route, "path", "unmatched")
+            method = scope["method"]
+
+            registry.histogram(
+                "techlingo_http_request_seconds", method=method, route=path
+            ).observe(elapsed)
+            registry.inc(
+                "techlingo_http_requests_total",
+                method=method, route=path, status=str(status["code"]),
+            )
+            if stats.queries:
+                registry.inc("techlingo_db_queries_total", stats.queries, method=method, route=path)
+                registry.inc("techlingo_db_seconds_total", stats.db_seconds, method=method, route=path)
+
+            if profiling and elapsed * 1000 >= METRICS_PROFILE_SLOW_MS and stats.samples:
+                _dump_profile(f"{method} {path}", elapsed, stats.samples)
+                registry.inc("techlingo_slow_requests_profiled_total", method=method, route=path)
@@ -0,0 +1,243 @@
+"""
+Versioned schema migrations
+
+Applied versions are recorded in the schema_migrations table, so running
+the upgrade against an existing database only applies what is missing.
+The app does not migrate on startup; run this once per deploy:
+
+    python migrations.py  # upgrade to the latest version
+"""
+
+from typing import Callable, List, Tuple
+
+from sqlalchemy import Engine, inspect, text
+from sqlalchemy.engine import Connection
+
+from database import engine, Base
+import models  # noqa: F401  (registers the tables on Base.metadata)
+
+
+# =========================
+# MIGRATION STEPS
+# =========================
+
+def _baseline(conn: Connection):
+    """Tables as created by earlier releases through create_all"""
+    Base.metadata.create_all(bind=conn)
+
+
+def _create_indexes(conn: Connection, table_name: str, *index_names: str):
+    table = Base.metadata.tables[table_name]
+    existing = {ix["name"] for ix in inspect(conn).get_indexes(table_name)}
+
+    for index in table.indexes:
+        if index.name in index_names and index.name not in existing:
+            index.create(bind=conn)
+
+
+def _hot_query_indexes(conn: Connection):
+    """Unique (user_id, term_id) progress rows plus user-scoped indexes"""
+    # Older SQLite databases may hold duplicate progress rows; fold them into
+    # the oldest row before the unique index can be built. Other backends
+    # only ever had the baseline schema, which already includes the index.
+    if conn.dialect.name == "sqlite":
+        _merge_duplicate_progress(conn)
+
+    _create_indexes(
+        conn, "user_progress",
+        "uq_user_progress_user_term", "ix_user_progress_user_last_seen",
+    )
+    _create_indexes(conn, "game_sessions", "ix_game_sessions_user_started")
+    _create_indexes(conn, "users", "ix_users_total_xp_covering")
+
+
+def _merge_duplicate_progress(conn: Connection):
+    from scheduler import MASTERY_THRESHOLD
+
+    # Mastered when any copy was, or when the merged answers reach the threshold
+    conn.execute(text(f"""
+        UPDATE user_progress SET
+            times_seen = (SELECT SUM(p.times_seen) FROM user_progress p
+                          WHERE p.user_id = user_progress.user_id
+                            AND p.term_id = user_progress.term_id),
+            times_correct = (SELECT SUM(p.times_correct) FROM user_progress p
+                             WHERE p.user_id = user_progress.user_id
+                               AND p.term_id = user_progress.term_id),
+            mastered = (SELECT MAX(p.mastered) OR SUM(p.times_correct) >= {MASTERY_THRESHOLD}
+                        FROM user_progress p
+                        WHERE p.user_id = user_progress.user_id
+                          AND p.term_id = user_progress.term_id),
+            last_seen_at = (SELECT MAX(p.last_seen_at) FROM user_progress p
+                            WHERE p.user_id = user_progress.user_id
+                              AND p.term_id = user_progress.term_id)
+        WHERE id IN (
+            SELECT MIN(id) FROM user_progress
+            GROUP BY user_id, term_id HAVING COUNT(*) > 1
+        )
+    """))
+    conn.execute(text("""
+        DELETE FROM user_progress WHERE id NOT IN (
+            SELECT MIN(id) FROM user_progress GROUP BY user_id, term_id
+        )
+    """))
+
+
+def _terms_fts(conn: Connection):
+    """Full-text index over term name and definition"""
+    if conn.dialect.name == "postgresql":
+        # Expression index matching main.terms_document, maintained by the server
+        conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_terms_fts ON terms "
+            "USING GIN (to_tsvector('english', name || ' ' || definition))"
+        ))
+        return
+
+    # SQLite: FTS5 table kept in sync by triggers
+    statements = [
+        """CREATE VIRTUAL TABLE IF NOT EXISTS terms_fts USING fts5(
+            name, definition, content='terms', content_rowid='id'
+        )""",
+        """CREATE TRIGGER IF NOT EXISTS terms_fts_ai AFTER INSERT ON terms BEGIN
+            INSERT INTO terms_fts(rowid, name, definition)
+            VALUES (new.id, new.name, new.definition);
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS terms_fts_ad AFTER DELETE ON terms BEGIN
+            INSERT INTO terms_fts(terms_fts, rowid, name, definition)
+            VALUES ('delete', old.id, old.name, old.definition);
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS terms_fts_au AFTER UPDATE ON terms BEGIN
+            INSERT INTO terms_fts(terms_fts, rowid, name, definition)
+            VALUES ('delete', old.id, old.name, old.definition);
+            INSERT INTO terms_fts(rowid, name, definition)
+            VALUES (new.id, new.name, new.definition);
+        END""",
+        "INSERT INTO terms_fts(terms_fts) VALUES ('rebuild')",
+    ]
+    for statement in statements:
+        conn.execute(text(statement))
+
+
+def _review_schedule(conn: Connection):
+    """Leitner box and due time per progress row, seeded from past answers"""
+    from scheduler import BOX_INTERVALS, MAX_BOX
+
+    existing = {col["name"] for col in inspect(conn).get_columns("user_progress")}
+    if "box" in existing:
+        return  # created by the baseline on a new database
+
+    conn.execute(text("ALTER TABLE user_progress ADD COLUMN box INTEGER NOT NULL DEFAULT 0"))
+    conn.execute(text("ALTER TABLE user_progress ADD COLUMN due_at INTEGER NOT NULL DEFAULT 0"))
+
+    # Mastered terms start in the top box, others one box per correct answer;
+    # each is due one interval after it was last seen
+    conn.execute(text(f"""
+        UPDATE user_progress
+        SET box = CASE WHEN mastered THEN {MAX_BOX}
+                       ELSE MIN(times_correct, {MAX_BOX}) END
+    """))
+    intervals = " ".join(
+        f"WHEN {box} THEN {interval}" for box, interval in enumerate(BOX_INTERVALS)
+    )
+    conn.execute(text(f"""
+        UPDATE user_progress
+        SET due_at = COALESCE(CAST(strftime('%s', last_seen_at) AS INTEGER), 0)
+                     + CASE box {intervals} END
+    """))
+
+
+def _term_distractors(conn: Connection):
+    """Table for the precomputed distractor index (filled by distractors.py)"""
+    Base.metadata.tables["term_distractors"].create(bind=conn, checkfirst=True)
+
+
+def _write_behind_state(conn: Connection):
+    """Highest write-behind log sequence applied to the database"""
+    conn.execute(text(
+        "CREATE TABLE IF NOT EXISTS write_behind_state ("
+        "id INTEGER PRIMARY KEY, "
+        "applied_seq INTEGER NOT NULL)"
+    ))
+
+
+def _deck_term_ids(conn: Connection):
+    """Term ids drawn per game session, so rebuilds do not depend on the schedule"""
+    existing = {col["name"] for col in inspect(conn).get_columns("game_sessions")}
+    if "deck_term_ids" in existing:
+        return  # created by the baseline on a new database
+
+    conn.execute(text("ALTER TABLE game_sessions ADD COLUMN deck_term_ids TEXT"))
+
+
+def _session_answered(conn: Connection):
+    """Answers scored per game session"""
+    existing = {col["name"] for col in inspect(conn).get_columns("game_sessions")}
+    if "answered" in existing:
+        return  # created by the baseline on a new database
+
+    conn.execute(text("ALTER TABLE game_sessions ADD COLUMN answered INTEGER NOT NULL DEFAULT 0"))
+
+
+MIGRATIONS: List[Tuple[int, str, Callable[[Connection], None]]] = [
+    (1, "baseline schema", _baseline),
+    (2, "hot query indexes", _hot_query_indexes),
+    (3, "full-text search on terms", _terms_fts),
+    (4, "spaced repetition schedule", _review_schedule),
+    (5, "term distractor index", _term_distractors),
+    (6, "write-behind log cursor", _write_behind_state),
+    (7, "game session deck terms", _deck_term_ids),
+    (8, "game session answer count", _session_answered),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+# =========================
+# RUNNER
+# =========================
+
+def current_version(conn: Connection) -> int:
+    """Return the highest applied migration version (0 for a new database)"""
+    conn.execute(text(
+        "CREATE TABLE IF NOT EXISTS schema_migrations ("
+        "version INTEGER PRIMARY KEY, "
+        "description VARCHAR(255) NOT NULL, "
+        "applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)"
+    ))
+    return conn.execute(
+        text("SELECT COALESCE(MAX(version), 0) FROM schema_migrations")
+    ).scalar_one()
+
+
+def schema_version(bind: Engine = engine) -> int:
+    """Like current_version, but read-only (for the app's startup check)"""
+    with bind.connect() as conn:
+        if not inspect(conn).has_table("schema_migrations"):
+            return 0
+        return conn.execute(
+            text("SELECT COALESCE(MAX(version), 0) FROM schema_migrations")
+        ).scalar_one()
+
+
+def upgrade(bind: Engine = engine) -> int:
+    """Apply pending migrations, each in its own transaction"""
+    with bind.begin() as conn:
+        version = current_version(conn)
+
+    for number, description, step in MIGRATIONS:
+        if number <= version:
+            continue
+
+        with bind.begin() as conn:
+            step(conn)
+            conn.execute(
+                text("INSERT INTO schema_migrations (version, description) VALUES (:v, :d)"),
+                {"v": number, "d": description},
+            )
+        version = number
+
+    return version
+
+
+if __name__ == "__main__":
+    version = upgrade()
+    print(f"Database schema at version {version}")
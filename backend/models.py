@@ -2,7 +2,7 @@ from datetime import datetime
 from typing import Optional, List
 
 from sqlalchemy import (
-    Integer, String, Text, Boolean, DateTime, ForeignKey
+    Integer, String, Text, Boolean, DateTime, Float, ForeignKey, Index
 )
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from sqlalchemy.sql import func
@@ -12,6 +12,10 @@ from database import Base
 
 class User(Base):
     __tablename__ = "users"
+    __table_args__ = (
+        # Covers the leaderboard: ORDER BY total_xp DESC reads only the index
+        Index("ix_users_total_xp_covering", "total_xp", "username", "current_streak"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     email: Mapped[str] = mapped_column(String(255), unique=True, index=True, nullable=False)
@@ -51,6 +55,9 @@ class Term(Base):
 
 class GameSession(Base):
     __tablename__ = "game_sessions"
+    __table_args__ = (
+        Index("ix_game_sessions_user_started", "user_id", "started_at"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
 
@@ -64,6 +71,12 @@ class GameSession(Base):
     difficulty: Mapped[Optional[str]] = mapped_column(String(20), nullable=True)
 
     total_questions: Mapped[int] = mapped_column(Integer, default=5)
+    # Comma-separated term ids of the drawn deck, so an evicted deck is
+    # rebuilt exactly
+    deck_term_ids: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    # Answers scored through /answer: where a rebuilt deck resumes, and
+    # what a round may add up to total_questions
+    answered: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
     correct_answers: Mapped[int] = mapped_column(Integer, default=0)
     xp_earned: Mapped[int] = mapped_column(Integer, default=0)
 
@@ -84,6 +97,10 @@ class GameSession(Base):
 
 class UserProgress(Base):
     __tablename__ = "user_progress"
+    __table_args__ = (
+        Index("uq_user_progress_user_term", "user_id", "term_id", unique=True),
+        Index("ix_user_progress_user_last_seen", "user_id", "last_seen_at"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
 
@@ -108,3 +125,26 @@ class UserProgress(Base):
     )
 
     mastered: Mapped[bool] = mapped_column(Boolean, default=False)
+
+    # Leitner box and next review time (unix seconds), see scheduler.py
+    box: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
+    due_at: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
+
+
+class TermDistractor(Base):
+    """Precomputed confusable terms, see distractors.py"""
+    __tablename__ = "term_distractors"
+
+    term_id: Mapped[int] = mapped_column(
+        Integer,
+        ForeignKey("terms.id"),
+        primary_key=True
+    )
+    rank: Mapped[int] = mapped_column(Integer, primary_key=True)
+
+    distractor_id: Mapped[int] = mapped_column(
+        Integer,
+        ForeignKey("terms.id"),
+        nullable=False
+    )
+    score: Mapped[float] = mapped_column(Float, nullable=False)
@@ -1,6 +1,18 @@
 import uvicorn
 
+from database import SessionLocal
+from migrations import upgrade
+from seed_data import seed_database
+
 if __name__ == "__main__":
+    # Development only: production deploys run migrations.py / seed_data.py once
+    upgrade()
+    db = SessionLocal()
+    try:
+        seed_database(db)
+    finally:
+        db.close()
+
     uvicorn.run(
         "main:app",
         host="127.0.0.1",
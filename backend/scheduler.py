@@ -0,0 +1,163 @@
+"""
+Leitner-style spaced repetition
+
+Each (user, term) progress row has a box and a due time. A correct answer
+moves the term up one box, a wrong one sends it back to box 0; the box
+decides how long until the term is due again. Each user's due times are
+kept in a min-heap, loaded from the database on first use and updated in
+place as answers come in, so picking due reviews costs O(k log n) for k
+picks instead of a scan over all of the user's progress rows.
+"""
+
+import heapq
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Tuple
+
+from sqlalchemy import case, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models import UserProgress
+
+# Seconds until a term in each box is due again
+BOX_INTERVALS = (
+    60,                 # 0: missed, ask again within the next game
+    60 * 60,            # 1
+    24 * 60 * 60,       # 2
+    3 * 24 * 60 * 60,   # 3
+    7 * 24 * 60 * 60,   # 4
+    30 * 24 * 60 * 60,  # 5
+)
+MAX_BOX = len(BOX_INTERVALS) - 1
+
+# Correct answers needed before a term counts as mastered
+MASTERY_THRESHOLD = 3
+
+# Users whose queues are kept in memory (least recently used are dropped)
+SCHEDULER_MAX_USERS = 10_000
+
+
+def next_box(box: int, is_correct: bool) -> int:
+    """The box after an answer"""
+    return min(box + 1, MAX_BOX) if is_correct else 0
+
+
+def next_box_expr(is_correct: bool):
+    """SQL for the box after an answer, from the stored box"""
+    if not is_correct:
+        return 0
+    return case((UserProgress.box >= MAX_BOX, MAX_BOX), else_=UserProgress.box + 1)
+
+
+def due_at_expr(box, now: int):
+    """SQL for the due time of a term placed in `box` at `now`"""
+    if isinstance(box, int):
+        return now + BOX_INTERVALS[box]
+    return now + case(
+        {i: interval for i, interval in enumerate(BOX_INTERVALS)},
+        value=box,
+        else_=BOX_INTERVALS[-1],
+    )
+
+
+class UserSchedule:
+    """
+    One user's terms ordered by due time.
+    Rescheduling pushes a new heap entry; the old one is skipped when it
+    surfaces because it no longer matches the term's current due time.
+    """
+
+    def __init__(self, rows: List[Tuple[int, int, int]] = ()):
+        self.due_at: Dict[int, int] = {}
+        self.box: Dict[int, int] = {}
+        for term_id, box, due_at in rows:
+            self.box[term_id] = box
+            self.due_at[term_id] = due_at
+        self._heap = [(due_at, term_id) for term_id, due_at in self.due_at.items()]
+        heapq.heapify(self._heap)
+
+    def __len__(self) -> int:
+        return len(self.due_at)
+
+    def __contains__(self, term_id: int) -> bool:
+        return term_id in self.due_at
+
+    def record(self, term_id: int, box: int, due_at: int):
+        self.box[term_id] = box
+        if self.due_at.get(term_id) != due_at:
+            self.due_at[term_id] = due_at
+            heapq.heappush(self._heap, (due_at, term_id))
+
+    def due(
+        self,
+        now: int,
+        limit: int,
+        accept: Callable[[int], bool] = lambda term_id: True
+    ) -> List[int]:
+        """
+        Up to `limit` accepted terms due at `now`, most overdue first.
+        Terms stay scheduled until they are answered.
+        """
+        picked: List[int] = []
+        popped: List[Tuple[int, int]] = []
+
+        while self._heap and len(picked) < limit:
+            due_at, term_id = self._heap[0]
+            if due_at > now:
+                break
+            heapq.heappop(self._heap)
+            if self.due_at.get(term_id) != due_at:
+                continue  # rescheduled since this entry was pushed
+            popped.append((due_at, term_id))
+            if accept(term_id):
+                picked.append(term_id)
+
+        for entry in popped:
+            heapq.heappush(self._heap, entry)
+        return picked
+
+
+def schedule_query(user_id: int):
+    """The user's Leitner boxes and due times, one row per term seen"""
+    return (
+        select(UserProgress.term_id, UserProgress.box, UserProgress.due_at)
+        .where(UserProgress.user_id == user_id)
+    )
+
+
+class Scheduler:
+    """Per-user schedules, built lazily and kept in LRU order"""
+
+    def __init__(self, max_users: int = SCHEDULER_MAX_USERS):
+        self.max_users = max_users
+        self._users: "OrderedDict[int, UserSchedule]" = OrderedDict()
+
+    async def get(self, db: AsyncSession, user_id: int) -> UserSchedule:
+        schedule = self._users.get(user_id)
+        if schedule is not None:
+            self._users.move_to_end(user_id)
+            return schedule
+
+        rows = (await db.execute(schedule_query(user_id))).all()
+
+        # Another request may have loaded it while we awaited the query
+        schedule = self._users.get(user_id)
+        if schedule is None:
+            schedule = UserSchedule(rows)
+            self._users[user_id] = schedule
+            while len(self._users) > self.max_users:
+                self._users.popitem(last=False)
+        return schedule
+
+    def record(self, user_id: int, term_id: int, box: int, due_at: int):
+        """Apply an answer to the cached schedule; uncached users load it later"""
+        schedule = self._users.get(user_id)
+        if schedule is not None:
+            schedule.record(term_id, box, due_at)
+
+
+def now_seconds() -> int:
+    return int(time.time())
+
+
+scheduler = Scheduler()
@@ -3,7 +3,7 @@ Pydantic schemas for request/response validation
 """
 
 from pydantic import BaseModel, EmailStr, Field
-from typing import Optional, List
+from typing import Any, Dict, Optional, List
 from datetime import datetime
 
 
@@ -38,6 +38,11 @@ class TokenResponse(BaseModel):
     user: UserResponse
 
 
+class EventsTokenResponse(BaseModel):
+    token: str
+    expires_in: int
+
+
 # ==================== TERM SCHEMAS ====================
 
 class TermCreate(BaseModel):
@@ -64,8 +69,10 @@ class TermResponse(BaseModel):
 
 
 class TermListResponse(BaseModel):
-    terms: List[TermResponse]
+    # Only the requested fields are present on each term
+    terms: List[Dict[str, Any]]
     total: int
+    next_cursor: Optional[int] = None
 
 
 # ==================== GAME SCHEMAS ====================
@@ -99,6 +106,20 @@ class AnswerResult(BaseModel):
     explanation: str
 
 
+class GameRoundResponse(BaseModel):
+    session_id: int
+    questions: List[GameQuestionResponse]
+
+
+class RoundAnswer(AnswerSubmit):
+    # Optional, but must name the session in the URL when sent
+    session_id: Optional[int] = None
+
+
+class RoundSubmit(BaseModel):
+    answers: List[RoundAnswer] = Field(..., min_length=1, max_length=50)
+
+
 class GameSessionResponse(BaseModel):
     id: int
     user_id: int
@@ -113,8 +134,19 @@ class GameSessionResponse(BaseModel):
         from_attributes = True
 
 
+class RoundResult(BaseModel):
+    results: List[AnswerResult]
+    session: GameSessionResponse
+
+
 # ==================== PROGRESS SCHEMAS ====================
 
+class CategoryProgress(BaseModel):
+    category: str
+    terms_mastered: int
+    total_terms: int
+
+
 class ProgressResponse(BaseModel):
     user_id: int
     terms_learned: int
@@ -122,6 +154,7 @@ class ProgressResponse(BaseModel):
     accuracy_rate: float
     categories_completed: List[str]
     recent_terms: List[TermResponse]
+    categories: List[CategoryProgress] = []
 
 
 class LeaderboardEntry(BaseModel):
@@ -129,3 +162,29 @@ class LeaderboardEntry(BaseModel):
     username: str
     total_xp: int
     current_streak: int
+
+
+# ==================== ADMIN SCHEMAS ====================
+
+class RejectedRow(BaseModel):
+    line: int
+    reason: str
+
+
+class ImportReportResponse(BaseModel):
+    rows_read: int
+    written: int
+    unchanged: int
+    rejected_count: int
+    # At most the first 100 rejected rows are listed
+    rejected: List[RejectedRow]
+    # "unchanged", "updating" (refreshed in the background) or
+    # "rebuild_needed" (too many changes: run python distractors.py)
+    distractors: str
+    elapsed_seconds: float
+    rows_per_second: float
+
+
+class CatalogReloadResponse(BaseModel):
+    terms: int
+    version: int
@@ -1,7 +1,12 @@
 """
 Seed data for initial terms
+
+One-shot setup for a new database (the app itself never seeds):
+
+    python seed_data.py   # migrate, seed the terms if empty, build the distractor index
 """
 
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 from models import Term
 
@@ -186,3 +191,29 @@ LPUSH notifications "New message"  # Push to list""",
     
     db.commit()
     print(f"Seeded {len(terms_data)} terms successfully!")
+
+
+def seed_database(db: Session) -> int:
+    """Seed the terms if there are none; returns the number of terms added"""
+    from distractors import index_is_empty, rebuild_distractors
+
+    seeded = 0
+    if db.scalar(select(Term.id).limit(1)) is None:
+        seed_terms(db)
+        seeded = db.query(Term).count()
+    if index_is_empty(db.get_bind()):
+        rebuild_distractors(db.get_bind())
+    return seeded
+
+
+if __name__ == "__main__":
+    from database import SessionLocal
+    from migrations import upgrade
+
+    upgrade()
+    db = SessionLocal()
+    try:
+        if not seed_database(db):
+            print("Terms already present, nothing to seed")
+    finally:
+        db.close()
@@ -0,0 +1,60 @@
+"""
+Production entry point: several uvicorn worker processes on one port
+
+    STATE_URL=redis://localhost:6379/0 python serve.py
+
+Configured from the environment:
+
+    HOST             interface to bind (0.0.0.0)
+    PORT             8081
+    WEB_CONCURRENCY  worker processes (one per CPU with a shared STATE_URL, else 1)
+    GRACEFUL_SHUTDOWN_SECONDS  wait for open connections on shutdown (10);
+                     /events streams never finish on their own
+
+Workers do not migrate or seed: run `python seed_data.py` (which applies
+migrations first) once per deploy. More than one worker needs a shared
+STATE_URL, so decks, leaderboard and schedule updates reach every worker,
+and cannot be combined with write-behind, whose log and buffer belong to
+one process.
+"""
+
+import logging
+import os
+import sys
+
+import uvicorn
+
+HOST = os.getenv("HOST", "0.0.0.0")
+PORT = int(os.getenv("PORT", "8081"))
+GRACEFUL_SHUTDOWN_SECONDS = int(os.getenv("GRACEFUL_SHUTDOWN_SECONDS", "10"))
+
+logger = logging.getLogger(__name__)
+
+
+def worker_count(shared: bool) -> int:
+    configured = os.getenv("WEB_CONCURRENCY")
+    if configured:
+        return int(configured)
+    return (os.cpu_count() or 1) if shared else 1
+
+
+def main():
+    from state import shared_state
+    from write_behind import WRITE_BEHIND_ENABLED
+
+    workers = worker_count(shared_state.shared)
+    if workers > 1 and not shared_state.shared:
+        sys.exit("More than one worker needs a shared STATE_URL (e.g. redis://localhost:6379/0)")
+    if workers > 1 and WRITE_BEHIND_ENABLED:
+        sys.exit("TECHLINGO_WRITE_BEHIND only supports a single worker")
+
+    logger.info("Starting %d worker(s) on %s:%d", workers, HOST, PORT)
+    uvicorn.run(
+        "main:app", host=HOST, port=PORT, workers=workers,
+        timeout_graceful_shutdown=GRACEFUL_SHUTDOWN_SECONDS,
+    )
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -0,0 +1,241 @@
+"""
+State shared between worker processes
+
+Values with an idle expiry (session decks) and messages broadcast to the
+other workers (catalog reloads, leaderboard and schedule updates), so
+in-process caches stay coherent when the app runs with several workers.
+
+    STATE_URL=memory://                  single process (default)
+    STATE_URL=redis://localhost:6379/0   any number of workers
+"""
+
+import asyncio
+import inspect
+import json
+import logging
+import os
+import time
+import uuid
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple, Union
+
+try:
+    import redis.asyncio as aioredis
+except ImportError:  # optional, only needed for STATE_URL=redis://...
+    aioredis = None
+
+logger = logging.getLogger(__name__)
+
+STATE_URL = os.getenv("STATE_URL", "memory://")
+STATE_KEY_PREFIX = "techlingo:"
+# Backoff between attempts to resubscribe after the pub/sub connection drops
+STATE_RECONNECT_MIN_SECONDS = 0.5
+STATE_RECONNECT_MAX_SECONDS = 30.0
+
+Handler = Callable[[Dict[str, Any]], Union[None, Awaitable[None]]]
+
+
+class SharedState(ABC):
+    """
+    Interface of the shared state backends.
+    Messages published by a worker reach every other worker; the publisher
+    is expected to have applied the change locally already.
+    """
+
+    shared = False
+
+    def __init__(self):
+        self.worker_id = uuid.uuid4().hex
+        self._handlers: Dict[str, Handler] = {}
+
+    def on(self, channel: str, handler: Handler):
+        """Call `handler(message)` for messages on `channel` (register before start())"""
+        self._handlers[channel] = handler
+
+    async def _dispatch(self, channel: str, message: Dict[str, Any]):
+        handler = self._handlers.get(channel)
+        if handler is None:
+            return
+        result = handler(message)
+        if inspect.isawaitable(result):
+            await result
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+    @abstractmethod
+    async def get(self, key: str, ttl: Optional[float] = None) -> Optional[str]:
+        """Return the value, restarting its expiry when `ttl` is given"""
+
+    @abstractmethod
+    async def set(self, key: str, value: str, ttl: float):
+        """Store the value, expiring `ttl` seconds after its last access"""
+
+    @abstractmethod
+    async def delete(self, key: str):
+        """Drop the value if there is one"""
+
+    @abstractmethod
+    async def publish(self, channel: str, message: Dict[str, Any]):
+        """Send `message` to the other workers' handlers for `channel`"""
+
+
+class InProcessState(SharedState):
+    """Plain dictionary; there are no other workers to notify"""
+
+    def __init__(self):
+        super().__init__()
+        self._values: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+
+    def _evict_expired(self, now: float):
+        # Entries are kept in last-access order, so expired ones are at the front
+        while self._values:
+            key, (_, expires_at) = next(iter(self._values.items()))
+            if expires_at > now:
+                break
+            del self._values[key]
+
+    async def get(self, key: str, ttl: Optional[float] = None) -> Optional[str]:
+        now = time.monotonic()
+        self._evict_expired(now)
+
+        entry = self._values.get(key)
+        if entry is None:
+            return None
+        if ttl is not None:
+            self._values[key] = (entry[0], now + ttl)
+            self._values.move_to_end(key)
+        return entry[0]
+
+    async def set(self, key: str, value: str, ttl: float):
+        now = time.monotonic()
+        self._evict_expired(now)
+        self._values[key] = (value, now + ttl)
+        self._values.move_to_end(key)
+
+    async def delete(self, key: str):
+        self._values.pop(key, None)
+
+    async def publish(self, channel: str, message: Dict[str, Any]):
+        pass
+
+
+class RedisState(SharedState):
+    """
+    Redis (or any server speaking its protocol) holds the values and
+    relays messages over pub/sub. `client` may be passed in, e.g. a
+    fakeredis client in tests.
+    """
+
+    shared = True
+
+    def __init__(self, url: str = "", client=None):
+        super().__init__()
+        if client is None:
+            if aioredis is None:
+                raise RuntimeError("STATE_URL=redis://... needs the redis package")
+            client = aioredis.from_url(url, decode_responses=True)
+        self.client = client
+        self._pubsub = None
+        self._listener: Optional[asyncio.Task] = None
+
+    async def start(self):
+        if not self._handlers:
+            return
+        await self._subscribe()
+        self._listener = asyncio.create_task(self._listen())
+
+    async def _subscribe(self):
+        self._pubsub = self.client.pubsub()
+        await self._pubsub.subscribe(*(STATE_KEY_PREFIX + channel for channel in self._handlers))
+
+    async def stop(self):
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+        if self._pubsub is not None:
+            await self._pubsub.aclose()
+        await self.client.aclose()
+
+    async def _listen(self):
+        """Relay messages to the handlers, resubscribing with backoff when the connection drops"""
+        delay = STATE_RECONNECT_MIN_SECONDS
+        while True:
+            started = time.monotonic()
+            try:
+                if self._pubsub is None:
+                    await self._subscribe()
+                    logger.info("Shared state subscription restored")
+                async for item in self._pubsub.listen():
+                    await self._handle(item)
+            except Exception as exc:
+                if time.monotonic() - started > STATE_RECONNECT_MAX_SECONDS:
+                    delay = STATE_RECONNECT_MIN_SECONDS  # it had been up for a while
+                # Messages sent meanwhile are lost; caches catch up on the next ones
+                logger.warning(
+                    "Shared state subscription lost (%s), retrying in %.1fs", exc, delay
+                )
+
+            pubsub, self._pubsub = self._pubsub, None
+            if pubsub is not None:
+                try:
+                    await pubsub.aclose()
+                except Exception:
+                    pass
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, STATE_RECONNECT_MAX_SECONDS)
+
+    async def _handle(self, item: Dict[str, Any]):
+        if item["type"] != "message":
+            return
+        try:
+            payload = json.loads(item["data"])
+            if payload["origin"] == self.worker_id:
+                return
+            channel = _as_str(item["channel"])[len(STATE_KEY_PREFIX):]
+            await self._dispatch(channel, payload["message"])
+        except Exception:
+            logger.exception("Shared state message failed")
+
+    async def get(self, key: str, ttl: Optional[float] = None) -> Optional[str]:
+        if ttl is None:
+            value = await self.client.get(STATE_KEY_PREFIX + key)
+        else:
+            value = await self.client.getex(STATE_KEY_PREFIX + key, px=int(ttl * 1000))
+        return None if value is None else _as_str(value)
+
+    async def set(self, key: str, value: str, ttl: float):
+        await self.client.set(STATE_KEY_PREFIX + key, value, px=int(ttl * 1000))
+
+    async def delete(self, key: str):
+        await self.client.delete(STATE_KEY_PREFIX + key)
+
+    async def publish(self, channel: str, message: Dict[str, Any]):
+        await self.client.publish(
+            STATE_KEY_PREFIX + channel,
+            json.dumps({"origin": self.worker_id, "message": message}),
+        )
+
+
+def _as_str(value) -> str:
+    return value.decode() if isinstance(value, bytes) else value
+
+
+def create_state(url: str = STATE_URL) -> SharedState:
+    """Backend for a STATE_URL"""
+    scheme = url.split("://", 1)[0]
+    if scheme == "memory":
+        return InProcessState()
+    if scheme in ("redis", "rediss", "unix"):
+        return RedisState(url)
+    raise ValueError(f"Unsupported STATE_URL: {url}")
+
+
+shared_state = create_state()
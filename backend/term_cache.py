@@ -0,0 +1,134 @@
+"""
+Pre-serialized /terms responses with strong ETags
+
+Each content coding is a different representation, so the gzip and br
+bodies get their own tags ("<sha1>-gzip", "<sha1>-br"); If-None-Match
+accepts any of them, since they all stand for the same data.
+"""
+
+import gzip
+import hashlib
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from pydantic import TypeAdapter
+
+from catalog import TermCatalog
+from fast_json import FAST_JSON_ENABLED, dump_terms
+from schemas import TermResponse
+
+try:
+    import brotli
+except ImportError:  # optional
+    brotli = None
+
+# Bodies smaller than this are not worth compressing
+MIN_COMPRESS_BYTES = 1024
+
+ENCODINGS = ("br", "gzip")
+
+_term_list_adapter = TypeAdapter(List[TermResponse])
+
+
+@dataclass
+class CachedBody:
+    body: bytes
+    etag: str
+    encoded: Dict[str, bytes] = field(default_factory=dict)
+
+    def etag_for(self, encoding: Optional[str]) -> str:
+        """The tag of the identity body, or of its `encoding` variant"""
+        return encoded_etag(self.etag, encoding)
+
+    def encode(self, encoding: str) -> bytes:
+        """Compress once per encoding and keep the result"""
+        data = self.encoded.get(encoding)
+        if data is None:
+            if encoding == "br":
+                data = brotli.compress(self.body)
+            else:
+                data = gzip.compress(self.body, mtime=0)
+            self.encoded[encoding] = data
+        return data
+
+
+class TermListCache:
+    """
+    Serialized term lists keyed by (category, difficulty).
+    Entries are dropped whenever the catalog version changes.
+    """
+
+    def __init__(self):
+        self._version: Optional[int] = None
+        self._entries: Dict[Tuple[Optional[str], Optional[str]], CachedBody] = {}
+
+    def get(
+        self,
+        catalog: TermCatalog,
+        category: Optional[str],
+        difficulty: Optional[str]
+    ) -> CachedBody:
+        if catalog.version != self._version:
+            self._entries = {}
+            self._version = catalog.version
+
+        key = (category or None, difficulty or None)
+        entry = self._entries.get(key)
+        if entry is not None:
+            return entry
+
+        pool = catalog.pool(*key)
+        if FAST_JSON_ENABLED:
+            body = dump_terms(pool)
+        else:
+            body = _term_list_adapter.dump_json(
+                [TermResponse.model_validate(t) for t in pool]
+            )
+        # Content hash, so every worker hands out the same ETag for the same data
+        entry = CachedBody(body=body, etag=f'"{hashlib.sha1(body).hexdigest()}"')
+
+        # Unknown filters are not cached, so arbitrary query strings cannot grow the cache
+        if pool:
+            self._entries[key] = entry
+        return entry
+
+
+def encoded_etag(etag: str, encoding: Optional[str]) -> str:
+    """'"<hash>"' -> '"<hash>-<encoding>"'; None keeps the identity tag"""
+    return f'{etag[:-1]}-{encoding}"' if encoding else etag
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    Weak comparison, as required for If-None-Match, against the identity
+    tag `etag` and every encoded variant of it
+    """
+    if not if_none_match:
+        return False
+    variants = {etag, *(encoded_etag(etag, encoding) for encoding in ENCODINGS)}
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or any(
+        tag.removeprefix("W/") in variants for tag in candidates
+    )
+
+
+def pick_encoding(accept_encoding: Optional[str], size: int) -> Optional[str]:
+    """Choose br or gzip from Accept-Encoding, or None to send identity"""
+    if not accept_encoding or size < MIN_COMPRESS_BYTES:
+        return None
+
+    offered = set()
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        if params.strip().replace(" ", "") in ("q=0", "q=0.0"):
+            continue
+        offered.add(name.strip().lower())
+
+    if brotli is not None and "br" in offered:
+        return "br"
+    if "gzip" in offered:
+        return "gzip"
+    return None
+
+
+term_list_cache = TermListCache()
@@ -0,0 +1,157 @@
+"""
+Smoke tests of the paths that differ between SQLite and PostgreSQL:
+migrations, the answer upsert, the round's UPDATE ... RETURNING, term
+search and the write-behind flush
+"""
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import inspect, text
+
+
+def sign_in(client: TestClient) -> dict:
+    client.post("/auth/register", json={"email": "a@b.com", "username": "alice", "password": "secret1"})
+    token = client.post("/auth/login", data={"username": "alice", "password": "secret1"}).json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}
+
+
+def progress_rows(app, user_id: int = 1):
+    with app.database.engine.connect() as conn:
+        return conn.execute(text(
+            "SELECT term_id, times_seen, times_correct, box FROM user_progress "
+            "WHERE user_id = :user_id ORDER BY term_id"
+        ), {"user_id": user_id}).all()
+
+
+def scalar(app, sql: str):
+    with app.database.engine.connect() as conn:
+        return conn.execute(text(sql)).scalar()
+
+
+def test_upgrade(backend):
+    app = backend()
+    migrations, engine = app.migrations, app.database.engine
+
+    assert migrations.schema_version(engine) == migrations.LATEST_VERSION
+    assert migrations.upgrade(engine) == migrations.LATEST_VERSION  # nothing left to apply
+
+    indexes = {ix["name"] for ix in inspect(engine).get_indexes("user_progress")}
+    assert "uq_user_progress_user_term" in indexes
+    columns = {col["name"] for col in inspect(engine).get_columns("game_sessions")}
+    assert {"deck_term_ids", "answered"} <= columns
+
+
+def test_answer(backend):
+    app = backend()
+    with TestClient(app.main.app) as client:
+        headers = sign_in(client)
+        session_id = client.post("/game/start", json={}, headers=headers).json()["id"]
+        question = client.get(f"/game/{session_id}/question", headers=headers).json()
+
+        # The second answer to the same term takes the upsert's conflict path
+        for answer in (question["correct_answer"], "wrong"):
+            response = client.post(
+                f"/game/{session_id}/answer",
+                json={"term_id": question["term_id"], "answer": answer},
+                headers=headers,
+            )
+            assert response.status_code == 200
+
+        assert progress_rows(app) == [(question["term_id"], 2, 1, 0)]
+        me = client.get("/auth/me", headers=headers).json()
+        assert (me["total_xp"], me["current_streak"]) == (10, 0)
+        assert scalar(app, "SELECT answered FROM game_sessions") == 2
+
+        progress = client.get("/progress", headers=headers).json()
+        assert (progress["terms_learned"], progress["accuracy_rate"]) == (0, 50.0)
+        assert [term["id"] for term in progress["recent_terms"]] == [question["term_id"]]
+
+
+def test_round(backend):
+    app = backend()
+    with TestClient(app.main.app) as client:
+        headers = sign_in(client)
+        session_id = client.post("/game/start", json={}, headers=headers).json()["id"]
+        questions = client.get(f"/game/{session_id}/round", headers=headers).json()["questions"]
+
+        answers = [{"term_id": q["term_id"], "answer": q["correct_answer"]} for q in questions]
+        answers[0]["answer"] = "wrong"
+
+        drawn = {q["term_id"] for q in questions}
+        other = next(t["id"] for t in client.get("/terms").json() if t["id"] not in drawn)
+        for rejected in (
+            [answers[1]] * len(answers),  # the same term over and over
+            answers[:-1] + [{"term_id": other, "answer": "x"}],  # a term not drawn
+            [{**answers[0], "session_id": session_id + 1}],  # another session's answer
+        ):
+            response = client.post(f"/game/{session_id}/round", json={"answers": rejected}, headers=headers)
+            assert response.status_code == 400
+        assert progress_rows(app) == []
+
+        response = client.post(f"/game/{session_id}/round", json={"answers": answers}, headers=headers)
+        assert response.status_code == 200
+
+        session = response.json()["session"]
+        assert session["completed"] is True
+        assert session["correct_answers"] == len(questions) - 1
+        assert len(progress_rows(app)) == len(questions)
+
+        # Completed by the same statement, so it cannot be scored twice
+        again = client.post(f"/game/{session_id}/round", json={"answers": answers}, headers=headers)
+        assert again.status_code == 400
+
+
+def test_search(backend):
+    app = backend()
+    with TestClient(app.main.app) as client:
+        response = client.get("/terms/search", params={"q": "containers"})
+        assert response.status_code == 200
+        assert "Docker" in [term["name"] for term in response.json()["terms"]]
+
+        assert client.get("/terms/search", params={"q": "zzzunknown"}).json()["total"] == 0
+
+
+def test_write_behind_flush(backend):
+    app = backend(TECHLINGO_WRITE_BEHIND="1", WRITE_BEHIND_FLUSH_MS="3600000")
+    write_behind = app.main.write_behind
+    with TestClient(app.main.app) as client:
+        headers = sign_in(client)
+        session_id = client.post("/game/start", json={}, headers=headers).json()["id"]
+        question = client.get(f"/game/{session_id}/question", headers=headers).json()
+        for _ in range(2):
+            client.post(
+                f"/game/{session_id}/answer",
+                json={"term_id": question["term_id"], "answer": question["correct_answer"]},
+                headers=headers,
+            )
+
+        assert progress_rows(app) == []  # logged, not yet applied
+        client.portal.call(write_behind.flush)
+
+        assert progress_rows(app) == [(question["term_id"], 2, 2, 2)]
+        assert scalar(app, "SELECT total_xp FROM users") == 20
+        assert scalar(app, "SELECT answered FROM game_sessions") == 2
+        assert scalar(app, "SELECT applied_seq FROM write_behind_state") == 2
+
+
+def test_terms_etag(backend):
+    app = backend()
+    with TestClient(app.main.app) as client:
+        identity = client.get("/terms", headers={"Accept-Encoding": "identity"})
+        gzipped = client.get("/terms", headers={"Accept-Encoding": "gzip"})
+        assert gzipped.headers["content-encoding"] == "gzip"
+
+        # Different bytes, different strong tags, same underlying data
+        tag = identity.headers["etag"]
+        assert gzipped.headers["etag"] == tag[:-1] + '-gzip"'
+        for sent in (tag, gzipped.headers["etag"], "W/" + gzipped.headers["etag"]):
+            again = client.get("/terms", headers={"If-None-Match": sent, "Accept-Encoding": "gzip"})
+            assert again.status_code == 304
+            assert again.headers["etag"] == gzipped.headers["etag"]
+
+
+@pytest.mark.parametrize("path", ["/terms", "/terms/page", "/progress/leaderboard"])
+def test_read_routes(backend, path):
+    app = backend()
+    with TestClient(app.main.app) as client:
+        assert client.get(path).status_code == 200
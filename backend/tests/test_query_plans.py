@@ -0,0 +1,61 @@
+"""
+EXPLAIN QUERY PLAN of the statements the hot routes actually run, compiled
+from the same builders (SQLite only: small test tables make PostgreSQL
+prefer sequential scans whatever the indexes)
+"""
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+pytestmark = pytest.mark.parametrize("database_url", ["sqlite"], indirect=True)
+
+
+def query_plan(app, statement) -> list:
+    compiled = statement.compile(dialect=app.database.engine.dialect)
+    params = tuple(compiled.params[name] for name in compiled.positiontup)
+    with app.database.engine.connect() as conn:
+        rows = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}", params)
+        return [row[-1] for row in rows]
+
+
+def assert_user_search(plan: list):
+    """One indexed lookup of the user's rows: no full scan, no temp b-tree sort"""
+    assert len(plan) == 1, plan
+    assert plan[0].startswith("SEARCH user_progress USING INDEX"), plan
+    assert "(user_id=?)" in plan[0], plan
+
+
+def test_progress_by_term(backend):
+    app = backend()
+    assert_user_search(query_plan(app, app.main._progress_by_term(1)))
+
+
+def test_recent_progress(backend):
+    app = backend()
+    plan = query_plan(app, app.main._recent_progress(1))
+    assert_user_search(plan)
+    # Already in last_seen_at order, so the LIMIT stops early
+    assert "ix_user_progress_user_last_seen" in plan[0]
+
+
+def test_review_schedule(backend):
+    app = backend()
+    from scheduler import schedule_query
+    assert_user_search(query_plan(app, schedule_query(1)))
+
+
+@pytest.mark.parametrize("is_correct", [True, False])
+def test_progress_upsert(backend, is_correct):
+    app = backend()
+    # The conflict target is resolved through the unique index, not a scan
+    assert query_plan(app, app.main._progress_upsert(1, 1, is_correct, 0)) == []
+
+
+def test_progress_upsert_needs_unique_index(backend):
+    app = backend()
+    with app.database.engine.begin() as conn:
+        conn.execute(text("DROP INDEX uq_user_progress_user_term"))
+    app.database.engine.dispose()  # pooled connections keep the old schema for EXPLAIN
+    with pytest.raises(OperationalError, match="ON CONFLICT clause does not match"):
+        query_plan(app, app.main._progress_upsert(1, 1, True, 0))
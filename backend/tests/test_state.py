@@ -0,0 +1,79 @@
+"""
+RedisState against fakeredis: values with an idle expiry, and messages
+that reach the other workers but not the one that sent them
+"""
+
+import asyncio
+
+import pytest
+
+import state
+
+fakeredis = pytest.importorskip("fakeredis")
+
+
+def redis_state(server) -> state.RedisState:
+    client = fakeredis.aioredis.FakeRedis(server=server, decode_responses=True)
+    return state.RedisState(client=client)
+
+
+def test_shared_state_is_abstract():
+    with pytest.raises(TypeError):
+        state.SharedState()
+
+
+def test_get_set_ttl():
+    async def run():
+        worker = redis_state(fakeredis.FakeServer())
+        try:
+            await worker.set("deck:1", "cards", ttl=0.2)
+            assert await worker.get("deck:1") == "cards"
+            assert 0 < await worker.client.pttl(state.STATE_KEY_PREFIX + "deck:1") <= 200
+
+            # A get with a ttl restarts the expiry
+            assert await worker.get("deck:1", ttl=60) == "cards"
+            assert await worker.client.pttl(state.STATE_KEY_PREFIX + "deck:1") > 200
+
+            await worker.set("deck:2", "cards", ttl=0.05)
+            await asyncio.sleep(0.1)
+            assert await worker.get("deck:2") is None
+
+            await worker.delete("deck:1")
+            assert await worker.get("deck:1") is None
+        finally:
+            await worker.stop()
+
+    asyncio.run(run())
+
+
+def test_publish_reaches_other_workers_only():
+    async def run():
+        server = fakeredis.FakeServer()
+        sender, other = redis_state(server), redis_state(server)
+        received = {"sender": [], "other": []}
+        delivered = {"sender": asyncio.Event(), "other": asyncio.Event()}
+
+        def handler(worker):
+            def handle(message):
+                received[worker].append(message)
+                delivered[worker].set()
+            return handle
+
+        sender.on("catalog", handler("sender"))
+        other.on("catalog", handler("other"))
+        await sender.start()
+        await other.start()
+        try:
+            await sender.publish("catalog", {"version": 2})
+            # Delivered in order, so once the sender sees this its own
+            # message has been through its listener too
+            await other.publish("catalog", {"version": 3})
+            for event in delivered.values():
+                await asyncio.wait_for(event.wait(), timeout=5)
+        finally:
+            await sender.stop()
+            await other.stop()
+
+        assert received == {"sender": [{"version": 3}], "other": [{"version": 2}]}
+
+    asyncio.run(run())
@@ -0,0 +1,422 @@
+"""
+Opt-in write-behind for answer outcomes
+
+Enable with TECHLINGO_WRITE_BEHIND=1. submit_answer then appends the
+outcome to an append-only log and folds it into in-memory deltas per
+progress row, user and session instead of committing. Concurrent answers
+share one fsync (group commit), and the deltas are written to
+user_progress, users and game_sessions in a single transaction every
+WRITE_BEHIND_FLUSH_MS, at end_game, and on shutdown.
+
+Each log record carries a sequence number; the highest one applied is
+stored in write_behind_state in the same transaction as the deltas, so
+after a crash the log is replayed from there without applying anything
+twice.
+"""
+
+import asyncio
+import json
+import logging
+import os
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import Boolean, DateTime, Integer, bindparam, case, text, update
+
+from database import AsyncSessionLocal, upsert
+from leaderboard import leaderboard
+from models import User, UserProgress
+from scheduler import BOX_INTERVALS, MASTERY_THRESHOLD, MAX_BOX, due_at_expr
+
+logger = logging.getLogger(__name__)
+
+WRITE_BEHIND_ENABLED = os.getenv("TECHLINGO_WRITE_BEHIND", "0") == "1"
+WRITE_BEHIND_FLUSH_MS = float(os.getenv("WRITE_BEHIND_FLUSH_MS", "200"))
+WRITE_BEHIND_LOG = os.getenv("WRITE_BEHIND_LOG", "./answers.log")
+# The log is truncated after a flush once it is this big and fully applied
+WRITE_BEHIND_LOG_MAX_BYTES = 16 * 1024 * 1024
+
+XP_PER_CORRECT_ANSWER = 10
+
+
+# =========================
+# DELTAS
+# =========================
+
+@dataclass
+class Run:
+    """A counter that wrong answers reset, such as a streak or a Leitner box"""
+    reset: bool = False
+    count: int = 0
+
+    def add(self, is_correct: bool):
+        if is_correct:
+            self.count += 1
+        else:
+            self.reset = True
+            self.count = 0
+
+    def then(self, later: "Run") -> "Run":
+        if later.reset:
+            return Run(True, later.count)
+        return Run(self.reset, self.count + later.count)
+
+
+@dataclass
+class ProgressDelta:
+    seen: int = 0
+    correct: int = 0
+    box: Run = field(default_factory=Run)
+    last_at: int = 0
+
+    def then(self, later: "ProgressDelta") -> "ProgressDelta":
+        return ProgressDelta(
+            self.seen + later.seen, self.correct + later.correct,
+            self.box.then(later.box), max(self.last_at, later.last_at),
+        )
+
+
+@dataclass
+class UserDelta:
+    xp: int = 0
+    streak: Run = field(default_factory=Run)
+
+    def then(self, later: "UserDelta") -> "UserDelta":
+        return UserDelta(self.xp + later.xp, self.streak.then(later.streak))
+
+
+@dataclass
+class SessionDelta:
+    answered: int = 0
+    correct: int = 0
+
+    def then(self, later: "SessionDelta") -> "SessionDelta":
+        return SessionDelta(self.answered + later.answered, self.correct + later.correct)
+
+
+@dataclass
+class Pending:
+    progress: Dict[Tuple[int, int], ProgressDelta] = field(default_factory=dict)
+    users: Dict[int, UserDelta] = field(default_factory=dict)
+    sessions: Dict[int, SessionDelta] = field(default_factory=dict)
+    last_seq: int = 0
+
+    def __bool__(self) -> bool:
+        return bool(self.progress or self.users or self.sessions)
+
+    def add(self, record: dict):
+        is_correct = record["correct"]
+
+        progress = self.progress.setdefault(
+            (record["user_id"], record["term_id"]), ProgressDelta()
+        )
+        progress.seen += 1
+        progress.correct += is_correct
+        progress.box.add(is_correct)
+        progress.last_at = max(progress.last_at, record["at"])
+
+        user = self.users.setdefault(record["user_id"], UserDelta())
+        user.xp += XP_PER_CORRECT_ANSWER if is_correct else 0
+        user.streak.add(is_correct)
+
+        session = self.sessions.setdefault(record["session_id"], SessionDelta())
+        session.answered += 1
+        session.correct += is_correct
+        self.last_seq = max(self.last_seq, record["seq"])
+
+    def then(self, later: "Pending") -> "Pending":
+        """Deltas of this batch followed by those of `later`"""
+        merged = Pending(last_seq=max(self.last_seq, later.last_seq))
+        for ours, theirs, out in (
+            (self.progress, later.progress, merged.progress),
+            (self.users, later.users, merged.users),
+            (self.sessions, later.sessions, merged.sessions),
+        ):
+            out.update(ours)
+            for key, delta in theirs.items():
+                out[key] = out[key].then(delta) if key in out else delta
+        return merged
+
+
+# =========================
+# SQL
+# =========================
+
+def _progress_upsert():
+    # Typed so that servers which prepare statements (PostgreSQL) can infer
+    # every parameter, including the ones only used in expressions
+    seen = bindparam("seen", type_=Integer)
+    correct = bindparam("correct", type_=Integer)
+    box_count = bindparam("box_count", type_=Integer)
+    last_seen_at = bindparam("last_seen_at", type_=DateTime(timezone=True))
+    new_box = case(
+        (bindparam("box_reset", type_=Boolean), box_count),
+        (UserProgress.box + box_count >= MAX_BOX, MAX_BOX),
+        else_=UserProgress.box + box_count,
+    )
+    return (
+        upsert(UserProgress)
+        .values(
+            user_id=bindparam("user_id", type_=Integer),
+            term_id=bindparam("term_id", type_=Integer),
+            times_seen=seen,
+            times_correct=correct,
+            mastered=correct >= MASTERY_THRESHOLD,
+            last_seen_at=last_seen_at,
+            box=bindparam("first_box", type_=Integer),
+            due_at=bindparam("new_due_at", type_=Integer),
+        )
+        .on_conflict_do_update(
+            index_elements=[UserProgress.user_id, UserProgress.term_id],
+            set_={
+                "times_seen": UserProgress.times_seen + seen,
+                "times_correct": UserProgress.times_correct + correct,
+                "mastered": case(
+                    (correct > 0, UserProgress.times_correct + correct >= MASTERY_THRESHOLD),
+                    else_=UserProgress.mastered,
+                ),
+                "last_seen_at": last_seen_at,
+                "box": new_box,
+                "due_at": due_at_expr(new_box, bindparam("last_at", type_=Integer)),
+            },
+        )
+    )
+
+
+def _progress_params(key: Tuple[int, int], delta: ProgressDelta) -> dict:
+    first_box = min(delta.box.count, MAX_BOX)
+    return {
+        "user_id": key[0],
+        "term_id": key[1],
+        "seen": delta.seen,
+        "correct": delta.correct,
+        "last_at": delta.last_at,
+        "last_seen_at": datetime.fromtimestamp(delta.last_at, timezone.utc),
+        "box_reset": delta.box.reset,
+        "box_count": delta.box.count,
+        "first_box": first_box,
+        "new_due_at": delta.last_at + BOX_INTERVALS[first_box],
+    }
+
+
+# =========================
+# LOG + BUFFER
+# =========================
+
+class WriteBehind:
+    def __init__(
+        self,
+        log_path: str = WRITE_BEHIND_LOG,
+        flush_interval: float = WRITE_BEHIND_FLUSH_MS / 1000
+    ):
+        self.log_path = log_path
+        self.flush_interval = flush_interval
+        self.pending = Pending()
+        self._flushing = Pending()  # batch being written by flush()
+
+        self._next_seq = 1
+        self._logged_seq = 0
+        self._applied_seq = 0
+        self._log = None
+        self._writing = False
+        self._queue: List[Tuple[dict, asyncio.Future]] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self._tasks: List[asyncio.Task] = []
+
+    # ---- lifecycle ----
+
+    async def start(self):
+        """Replay records logged but not applied before the last shutdown, then start the tasks"""
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+
+        async with AsyncSessionLocal() as db:
+            self._applied_seq = await db.scalar(
+                text("SELECT applied_seq FROM write_behind_state WHERE id = 1")
+            ) or 0
+
+        replayed = 0
+        if os.path.exists(self.log_path):
+            with open(self.log_path) as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        break  # torn write at the crash; never acknowledged
+                    self._next_seq = max(self._next_seq, record["seq"] + 1)
+                    if record["seq"] > self._applied_seq:
+                        self.pending.add(record)
+                        replayed += 1
+        self._next_seq = max(self._next_seq, self._applied_seq + 1)
+        self._logged_seq = self._next_seq - 1
+
+        self._log = open(self.log_path, "a")
+        if replayed:
+            logger.info("Replaying %d answers from %s", replayed, self.log_path)
+            await self.flush()
+
+        self._tasks = [
+            asyncio.create_task(self._write_log()),
+            asyncio.create_task(self._flush_periodically()),
+        ]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        await self._sync_queue()
+        await self.flush()
+        if self._log is not None:
+            self._log.close()
+            self._log = None
+
+    # ---- recording ----
+
+    async def record(self, user_id: int, session_id: int, term_id: int, is_correct: bool, at: int):
+        """Return once the outcome is durable in the log"""
+        record = {
+            "seq": self._next_seq,
+            "user_id": user_id,
+            "session_id": session_id,
+            "term_id": term_id,
+            "correct": int(is_correct),
+            "at": at,
+        }
+        self._next_seq += 1
+
+        future = asyncio.get_running_loop().create_future()
+        self._queue.append((record, future))
+        self._wakeup.set()
+        await future
+
+    def has_pending(self, user_id: int) -> bool:
+        """Whether the user has answers not yet committed, including a batch being flushed"""
+        return user_id in self.pending.users or user_id in self._flushing.users
+
+    def _write_batch(self, lines: List[str]):
+        self._log.write("".join(lines))
+        self._log.flush()
+        os.fsync(self._log.fileno())
+
+    async def _sync_queue(self):
+        """Log and buffer everything queued so far with a single fsync"""
+        batch, self._queue = self._queue, []
+        if not batch:
+            return
+        self._writing = True
+        try:
+            await asyncio.to_thread(
+                self._write_batch, [json.dumps(record) + "\n" for record, _ in batch]
+            )
+        except Exception as exc:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(exc)
+            return
+        finally:
+            self._writing = False
+
+        # Buffered in sequence order with no await in between, so the
+        # buffer always holds a prefix of the log and last_seq is safe to
+        # record as applied
+        for record, future in batch:
+            self.pending.add(record)
+            self._logged_seq = record["seq"]
+            if not future.done():
+                future.set_result(None)
+
+    async def _write_log(self):
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            await self._sync_queue()
+
+    # ---- flushing ----
+
+    async def _flush_periodically(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Write-behind flush failed; will retry")
+
+    async def flush(self):
+        """Write all buffered deltas in one transaction"""
+        async with self._flush_lock:
+            batch, self.pending = self.pending, Pending()
+            if not batch:
+                return
+
+            self._flushing = batch
+            try:
+                totals = await self._apply(batch)
+            except Exception:
+                # Keep the deltas, ahead of anything buffered meanwhile
+                self.pending = batch.then(self.pending)
+                raise
+            finally:
+                self._flushing = Pending()
+
+            self._applied_seq = batch.last_seq
+            for user_id, total_xp, current_streak in totals:
+                leaderboard.update(user_id, total_xp, current_streak)
+            self._truncate_log_if_applied()
+
+    async def _apply(self, batch: Pending) -> List[Tuple[int, int, int]]:
+        async with AsyncSessionLocal() as db:
+            # Core connection, so the parameter lists run as plain executemany
+            conn = await db.connection()
+            await conn.execute(
+                _progress_upsert(),
+                [_progress_params(key, delta) for key, delta in batch.progress.items()],
+            )
+
+            sessions = [
+                {"session_id": session_id, "answered": delta.answered, "correct": delta.correct}
+                for session_id, delta in batch.sessions.items()
+            ]
+            if sessions:
+                await conn.execute(
+                    text("UPDATE game_sessions SET answered = answered + :answered, "
+                         "correct_answers = correct_answers + :correct "
+                         "WHERE id = :session_id"),
+                    sessions,
+                )
+
+            totals = []
+            for user_id, delta in batch.users.items():
+                row = (await conn.execute(
+                    update(User)
+                    .where(User.id == user_id)
+                    .values(
+                        total_xp=User.total_xp + delta.xp,
+                        current_streak=delta.streak.count if delta.streak.reset
+                        else User.current_streak + delta.streak.count,
+                    )
+                    .returning(User.id, User.total_xp, User.current_streak)
+                )).first()
+                if row is not None:
+                    totals.append(tuple(row))
+
+            await conn.execute(
+                text("INSERT INTO write_behind_state (id, applied_seq) VALUES (1, :seq) "
+                     "ON CONFLICT(id) DO UPDATE SET applied_seq = excluded.applied_seq"),
+                {"seq": batch.last_seq},
+            )
+            await db.commit()
+        return totals
+
+    def _truncate_log_if_applied(self):
+        if self._log is None or self._writing or self._queue \
+                or self._logged_seq > self._applied_seq:
+            return
+        if self._log.tell() >= WRITE_BEHIND_LOG_MAX_BYTES:
+            self._log.truncate(0)
+            self._log.seek(0)
+
+
+write_behind = WriteBehind()
@@ -126,4 +126,40 @@ export const progressApi = {
   },
 };
 
+// Live XP/rank and leaderboard updates (Server-Sent Events)
+export const eventsApi = {
+  // handlers: { me: (entry) => {}, leaderboard: (entries) => {} }; returns a close function
+  // The URL carries a short-lived stream token, never the access token
+  subscribe: (handlers) => {
+    let source = null;
+    let closed = false;
+
+    const connect = async () => {
+      try {
+        const response = await api.post('/events/token');
+        if (closed) return;
+        source = new EventSource(`${API_BASE_URL}/events?token=${encodeURIComponent(response.data.token)}`);
+      } catch (error) {
+        if (!closed) setTimeout(connect, 3000);
+        return;
+      }
+      Object.entries(handlers).forEach(([event, handler]) => {
+        source.addEventListener(event, (e) => handler(JSON.parse(e.data)));
+      });
+      // Reconnects reuse the URL, whose token has expired by then: get a new one
+      source.onerror = () => {
+        if (source.readyState === EventSource.CLOSED && !closed) {
+          setTimeout(connect, 3000);
+        }
+      };
+    };
+
+    connect();
+    return () => {
+      closed = true;
+      if (source) source.close();
+    };
+  },
+};
+
 export default api;